@@ -1,7 +1,26 @@
 from django.contrib import admin
+
 from .models import Comment, Post
+from .moderation import approve_comments, remove_comments
 
 # Register your models here.
 
+
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ("author", "post", "created_date", "approved_comment")
+    list_filter = ("approved_comment",)
+    actions = ["approve_selected", "remove_selected"]
+
+    @admin.action(description="Approve selected comments")
+    def approve_selected(self, request, queryset):
+        approved = approve_comments(queryset)
+        self.message_user(request, f"Approved {approved} comments.")
+
+    @admin.action(description="Remove selected comments")
+    def remove_selected(self, request, queryset):
+        removed = remove_comments(queryset)
+        self.message_user(request, f"Removed {removed} comments.")
+
+
 admin.site.register(Post)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,163 @@
+"""
+Async versions of the public read views and the comment view, for serving under ASGI.
+
+They use the same page cache and conditional GET validators as the sync views, and the detail
+view fetches its post with the async ORM. The rest of a page, i.e. the list's page of posts and
+the detail's page of comments, comes from the `get_context_data()` of `PostListView` and
+`PostDetailView`, run in a worker thread along with rendering, so a request doesn't hold up
+the event loop while it waits on the database. They're used instead of the sync views when
+`settings.BLOG_ASYNC_VIEWS` is on.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import cache_page, cached_page, detail_cache_key, list_cache_key, uses_page_cache
+from .comment_queue import enqueue_comment, queue_enabled
+from .conditional import (
+    post_detail_etag,
+    post_detail_last_modified,
+    post_list_etag,
+)
+from .forms import CommentForm
+from .models import Post
+from .routers import use_primary_db
+from .views import PostDetailView, PostListView
+
+
+def _require_safe(view):
+    # django.views.decorators.http.require_safe() only wraps sync views in this version of
+    # Django
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return HttpResponseNotAllowed(["GET", "HEAD"])
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@sync_to_async
+def _cached_page(request, cache_key_func, *args):
+    # loading the user from the session is sync-only in this version of Django, so checking
+    # whether the page is cacheable happens in a worker thread along with the cache lookup
+    if not uses_page_cache(request):
+        return None, None
+    cache_key = cache_key_func(request, *args)
+    return cache_key, cached_page(request, cache_key)
+
+
+@sync_to_async
+def _validators(request, etag_func, last_modified_func, *args):
+    etag = etag_func(request, *args)
+    last_modified = last_modified_func(request, *args) if last_modified_func else None
+    return (
+        quote_etag(etag) if etag else None,
+        int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def _set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        if etag:
+            response.headers.setdefault("ETag", etag)
+        if last_modified:
+            response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
+
+
+async def _context(view, **kwargs):
+    # the sync view's own context, with its pagination and comments, built in one trip to the
+    # worker thread the async ORM runs queries in
+    return await sync_to_async(view.get_context_data)(**kwargs)
+
+
+@sync_to_async
+def _render(request, template_name, context):
+    # rendering is CPU bound, so it happens in a worker thread
+    return TemplateResponse(request, template_name, context).render()
+
+
+@_require_safe
+async def post_list(request):
+    cache_key, response = await _cached_page(request, list_cache_key)
+    if response is not None:
+        return response
+
+    etag, last_modified = await _validators(request, post_list_etag, None)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    view = PostListView()
+    view.setup(request)
+    view.object_list = view.get_queryset()
+    context = await _context(view)
+    response = await _render(request, view.get_template_names()[0], context)
+    _set_validators(response, etag, last_modified)
+    if cache_key:
+        timeout = await sync_to_async(view.get_page_cache_timeout)()
+        await sync_to_async(cache_page)(cache_key, response, timeout)
+    return response
+
+
+@_require_safe
+async def post_detail(request, pk):
+    cache_key, response = await _cached_page(request, detail_cache_key, pk)
+    if response is not None:
+        return response
+
+    etag, last_modified = await _validators(
+        request, post_detail_etag, post_detail_last_modified, pk
+    )
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    view = PostDetailView()
+    view.setup(request, pk=pk)
+    try:
+        view.object = await view.get_queryset().aget(pk=pk)
+    except Post.DoesNotExist:
+        raise Http404("No post found matching the query")
+    context = await _context(view, object=view.object)
+    response = await _render(request, view.get_template_names()[0], context)
+    _set_validators(response, etag, last_modified)
+    if cache_key:
+        timeout = await sync_to_async(view.get_page_cache_timeout)()
+        await sync_to_async(cache_page)(cache_key, response, timeout)
+    return response
+
+
+async def _get_post(pk):
+    try:
+        return await Post.objects.aget(pk=pk)
+    except Post.DoesNotExist:
+        raise Http404("No post found matching the query")
+
+
+@use_primary_db
+async def add_comment_to_post(request, pk):
+    if request.method == "POST":
+        form = CommentForm(request.POST)
+        if form.is_valid():
+            comment = form.save(commit=False)
+            if queue_enabled():
+                # the queue worker drops comments on missing posts, so don't query for it here
+                comment.post_id = pk
+                await sync_to_async(enqueue_comment)(comment)
+                return redirect(reverse("blog:detail", kwargs={"pk": pk}) + "?comment=pending")
+            comment.post = await _get_post(pk)
+            await comment.asave()
+            return redirect("blog:detail", pk=pk)
+    else:
+        form = CommentForm()
+    await _get_post(pk)
+    return await _render(request, "blog/add_comment_to_post.html", {"form": form})
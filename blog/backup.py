@@ -0,0 +1,159 @@
+"""
+Streaming export and import of posts and comments, as newline-delimited JSON (NDJSON):
+
+    {"model": "post", "id": 3, "author": "ola", "title": "...", "text": "...", ...}
+    {"model": "comment", "id": 7, "post": 3, "author": "reader", "text": "...", ...}
+
+Posts come before comments, so each comment's post already exists when it's imported.
+Neither direction holds more than one batch of rows in memory. Authors are matched to users
+by username, and a user missing from the database is created without a usable password.
+
+Rows are imported with `bulk_create()`, which sends no signals: run `rebuild_comment_counts`
+and `rebuild_search_index` afterwards and invalidate the cached pages of the posts imported
+into, as the `import_blog` command does, even when the import stops part way through.
+"""
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post, make_excerpt
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _parse_date(value):
+    if value is None:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    return date
+
+
+def export_records(batch_size=2000):
+    """
+    Yields every post and then every comment as a dict, reading `batch_size` rows at a time.
+    """
+    posts = (
+        Post.objects.order_by("pk")
+        .values("pk", "author__username", "title", "text", "created_date", "published_date")
+        .iterator(chunk_size=batch_size)
+    )
+    for post in posts:
+        yield {
+            "model": "post",
+            "id": post["pk"],
+            "author": post["author__username"],
+            "title": post["title"],
+            "text": post["text"],
+            "created_date": _date(post["created_date"]),
+            "published_date": _date(post["published_date"]),
+        }
+    comments = (
+        Comment.objects.order_by("pk")
+        .values("pk", "post", "author", "text", "created_date", "approved_comment")
+        .iterator(chunk_size=batch_size)
+    )
+    for comment in comments:
+        yield {
+            "model": "comment",
+            "id": comment["pk"],
+            "post": comment["post"],
+            "author": comment["author"],
+            "text": comment["text"],
+            "created_date": _date(comment["created_date"]),
+            "approved_comment": comment["approved_comment"],
+        }
+
+
+def _author_id(username, authors):
+    if username not in authors:
+        authors[username] = User.objects.create_user(username).pk
+    return authors[username]
+
+
+def _post(record, authors):
+    return Post(
+        id=record["id"],
+        author_id=_author_id(record["author"], authors),
+        title=record["title"],
+        text=record["text"],
+        excerpt=make_excerpt(record["text"]),
+        created_date=_parse_date(record["created_date"]),
+        published_date=_parse_date(record["published_date"]),
+    )
+
+
+def _comment(record, authors):
+    return Comment(
+        id=record["id"],
+        post_id=record["post"],
+        author=record["author"],
+        text=record["text"],
+        created_date=_parse_date(record["created_date"]),
+        approved_comment=record["approved_comment"],
+    )
+
+
+BUILDERS = {"post": (Post, _post), "comment": (Comment, _comment)}
+
+
+def _insert(model, objects):
+    with transaction.atomic():
+        model.objects.bulk_create(objects)
+
+
+def _post_id(obj):
+    return obj.pk if isinstance(obj, Post) else obj.post_id
+
+
+def import_records(lines, batch_size=1000, post_ids=None):
+    """
+    Imports the NDJSON `lines`, inserting `batch_size` rows at a time, each batch in its own
+    transaction. Yields the running counts of imported posts and comments after each batch,
+    and adds the id of every post imported, or imported a comment of, to the set `post_ids`
+    if given. Raises ValueError for a malformed line, naming it.
+    """
+    # username: user id, for every user seen so far
+    authors = dict(User.objects.values_list("username", "pk"))
+    counts = {"post": 0, "comment": 0}
+    kind = None
+    batch = []
+
+    def insert():
+        _insert(BUILDERS[kind][0], batch)
+        counts[kind] += len(batch)
+        if post_ids is not None:
+            post_ids.update(_post_id(obj) for obj in batch)
+
+    try:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                model, build = BUILDERS[record["model"]]
+                obj = build(record, authors)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Line {number}: {e!r}") from e
+            if batch and (record["model"] != kind or len(batch) >= batch_size):
+                insert()
+                batch = []
+                yield dict(counts)
+            kind = record["model"]
+            batch.append(obj)
+        if batch:
+            insert()
+            yield dict(counts)
+    finally:
+        # rows were inserted with their ids, so move the id sequences past them, including
+        # those of the batches committed before an error
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post, Comment]):
+                cursor.execute(sql)
@@ -0,0 +1,146 @@
+"""
+Helpers for the benchmark management commands: seeding a scratch database, building request
+traces, and summarising latencies.
+
+A trace is a list of requests, stored one JSON object per line:
+
+    {"method": "GET", "path": "/3/"}
+    {"method": "POST", "path": "/post/3/comment/", "data": {"author": "a", "text": "b"}}
+    {"method": "POST", "path": "/post/7/publish/", "user": "user1"}
+
+`user` logs the request in as that user first. Seeding is deterministic on a fresh database,
+so the primary keys in a recorded trace match the seeded posts when it's replayed.
+"""
+
+import datetime
+import json
+import math
+import random
+import statistics
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+
+from .models import Comment, Post
+
+PASSWORD = "benchmark"
+
+# share of each kind of request in a synthetic trace
+DEFAULT_MIX = {"list": 60, "detail": 30, "comment": 8, "publish": 2}
+
+
+@contextmanager
+def scratch_database():
+    """
+    Runs the block against a newly created test database, destroyed afterwards.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_database(users=5, posts=50, comments=20, drafts=0):
+    """
+    Creates `users` users, `posts` published posts with `comments` approved comments each,
+    and `drafts` unpublished posts. Returns the published posts and the drafts.
+    """
+    authors = [
+        User.objects.create_user(f"user{number}", password=PASSWORD) for number in range(users)
+    ]
+    now = timezone.now()
+    published = []
+    for number in range(posts):
+        post = Post(author=authors[number % users], title=f"Post {number}", text="text " * 200)
+        post.publish(date=now - datetime.timedelta(minutes=posts - number))
+        published.append(post)
+    Comment.objects.bulk_create(
+        Comment(post=post, author="reader", text=f"comment {number}", approved_comment=True)
+        for post in published
+        for number in range(comments)
+    )
+    unpublished = [
+        Post.objects.create(author=authors[number % users], title=f"Draft {number}", text="text")
+        for number in range(drafts)
+    ]
+    return published, unpublished
+
+
+def synthetic_trace(count, published, drafts, mix=None, seed=0):
+    """
+    Returns `count` requests chosen at random in the proportions given by `mix`.
+    Each publish request uses up one of `drafts`; once they run out it re-publishes a post.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    drafts = list(drafts)
+    pages = max(1, len(published) // 2)
+    trace = []
+    for kind in rng.choices(list(mix), weights=list(mix.values()), k=count):
+        post = rng.choice(published)
+        if kind == "list":
+            trace.append({"method": "GET", "path": f"/?page={rng.randint(1, pages)}"})
+        elif kind == "detail":
+            trace.append({"method": "GET", "path": f"/{post.pk}/"})
+        elif kind == "comment":
+            trace.append(
+                {
+                    "method": "POST",
+                    "path": f"/post/{post.pk}/comment/",
+                    "data": {"author": "benchmark", "text": "a benchmark comment"},
+                }
+            )
+        elif kind == "publish":
+            target = drafts.pop() if drafts else post
+            trace.append(
+                {
+                    "method": "POST",
+                    "path": f"/post/{target.pk}/publish/",
+                    "user": target.author.username,
+                }
+            )
+        else:
+            raise ValueError(f"Unknown request kind: {kind}")
+    return trace
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_trace(path, trace):
+    with open(path, "w") as f:
+        for entry in trace:
+            f.write(json.dumps(entry) + "\n")
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value at `fraction` (0 to 1) of `sorted_values`, by the nearest-rank method.
+    """
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(latencies, elapsed=None):
+    """
+    Returns the count, p50/p90/p99 and mean in milliseconds, and the requests per second, of
+    a list of latencies in seconds. `elapsed` defaults to their sum.
+    """
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0}
+    elapsed = elapsed or sum(latencies)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
@@ -0,0 +1,148 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .routers import pin_to_primary
+
+LIST_GENERATION_KEY = "blog:post_list:generation"
+# set for `settings.BLOG_REPLICA_LAG_SECONDS` after any page is invalidated
+RECENTLY_INVALIDATED_KEY = "blog:recently_invalidated"
+
+
+def page_cache():
+    return caches[settings.BLOG_PAGE_CACHE_ALIAS]
+
+
+def _new_generation():
+    # start from the clock so an evicted counter can't restart at a value with stale pages
+    return time.time_ns()
+
+
+def _page_key(prefix, generation_key, request):
+    # every variant of a page (query string) shares a generation number, so all of them
+    # can be invalidated at once by changing it
+    generation = page_cache().get_or_set(generation_key, _new_generation, timeout=None)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"{prefix}:{generation}:{path}"
+
+
+def list_cache_key(request):
+    """
+    Cache key for a page of the post list.
+    """
+    return _page_key("blog:post_list", LIST_GENERATION_KEY, request)
+
+
+def _detail_generation_key(pk):
+    return f"blog:detail:{pk}:generation"
+
+
+def detail_cache_key(request, pk):
+    """
+    Cache key for the detail page of post `pk`, including its page of comments.
+    """
+    return _page_key(f"blog:detail:{pk}", _detail_generation_key(pk), request)
+
+
+def _invalidated():
+    if settings.BLOG_READ_REPLICAS:
+        page_cache().set(RECENTLY_INVALIDATED_KEY, True, settings.BLOG_REPLICA_LAG_SECONDS)
+
+
+def pin_refill_to_primary():
+    """
+    Sends the queries for a page that's about to be cached to the primary if anything was
+    invalidated within `settings.BLOG_REPLICA_LAG_SECONDS`, as a replica may not have the change
+    yet and the stale page would stay cached.
+    """
+    if settings.BLOG_READ_REPLICAS and page_cache().get(RECENTLY_INVALIDATED_KEY):
+        pin_to_primary()
+
+
+def invalidate_post_list():
+    _invalidated()
+    cache = page_cache()
+    try:
+        cache.incr(LIST_GENERATION_KEY)
+    except ValueError:
+        cache.set(LIST_GENERATION_KEY, _new_generation(), timeout=None)
+
+
+def invalidate_post(pk, post_list=True):
+    """
+    Drops the cached detail page for post `pk` and, unless `post_list` is False, every cached
+    page of the post list.
+    """
+    page_cache().delete(_detail_generation_key(pk))
+    if post_list:
+        invalidate_post_list()
+    else:
+        _invalidated()
+
+
+def uses_page_cache(request):
+    """
+    Whether the response to `request` comes from the page cache: GET requests from anonymous
+    users, while `settings.BLOG_PAGE_CACHE_TIMEOUT` is set.
+    """
+    return (
+        request.method == "GET"
+        and not request.user.is_authenticated
+        and bool(settings.BLOG_PAGE_CACHE_TIMEOUT)
+    )
+
+
+def cached_page(request, key):
+    """
+    Returns the page cached under `key` as the response to `request`, or None if it isn't
+    cached, in which case the queries for the page that will be cached may be pinned to the
+    primary.
+    """
+    response = page_cache().get(key)
+    if response is None:
+        pin_refill_to_primary()
+        return None
+    # answer conditional requests from the validators stored with the cached page
+    return get_conditional_response(
+        request,
+        etag=response.get("ETag"),
+        last_modified=parse_http_date_safe(response.get("Last-Modified")),
+        response=response,
+    )
+
+
+def cache_page(key, response, timeout):
+    """
+    Caches the template response `response` under `key` once it's rendered, unless it isn't a
+    200 or sets cookies.
+    """
+    if response.status_code == 200 and not response.cookies:
+        response.add_post_render_callback(lambda r: page_cache().set(key, r, timeout))
+
+
+class AnonymousPageCacheMixin:
+    """
+    View mixin that caches the rendered response of GET requests from anonymous users.
+    Logged-in users always get a freshly rendered page. Views implement `get_page_cache_key()`.
+    """
+
+    def get_page_cache_key(self):
+        raise NotImplementedError("subclasses must implement get_page_cache_key()")
+
+    def get_page_cache_timeout(self):
+        return settings.BLOG_PAGE_CACHE_TIMEOUT
+
+    def dispatch(self, request, *args, **kwargs):
+        if not uses_page_cache(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_page_cache_key()
+        response = cached_page(request, key)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            cache_page(key, response, self.get_page_cache_timeout())
+        return response
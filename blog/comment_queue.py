@@ -0,0 +1,158 @@
+"""
+A durable, append-only queue for new comments.
+
+When `settings.BLOG_COMMENT_QUEUE_DIR` is set, `add_comment_to_post` appends each valid
+comment as a JSON line to a spool file in that directory instead of inserting it, so a burst
+of comments doesn't queue up on SQLite's write lock. `manage.py process_comment_queue` drains
+the spool and inserts the comments with `bulk_create`.
+
+Writers hold an exclusive `flock` while appending. The worker takes the same lock to rename
+the spool file out of the way, so every line ends up either in the file it processes or in
+a new spool file. Delivery is at-least-once: if the worker dies after inserting a batch but
+before deleting its file, that batch is inserted again on the next run.
+
+The view doesn't look up the post, so queueing a comment makes no queries; the worker drops
+comments whose post doesn't exist. Lines that aren't a valid comment, such as a partly
+written line from a crashed writer, are appended to the dead-letter file in the same
+directory instead of blocking the queue.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import invalidate_post
+from .models import Comment, Post
+
+SPOOL_NAME = "comments.jsonl"
+PROCESSING_SUFFIX = ".processing"
+DEAD_LETTER_NAME = "comments.rejected.jsonl"
+
+
+def queue_enabled():
+    return bool(settings.BLOG_COMMENT_QUEUE_DIR)
+
+
+def _queue_dir():
+    path = Path(settings.BLOG_COMMENT_QUEUE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def enqueue_comment(comment):
+    """
+    Appends an unsaved `comment` to the spool file.
+    """
+    # POSIX only, so imported here: the views import this module even with the queue off
+    import fcntl
+
+    line = json.dumps(
+        {
+            "post": comment.post_id,
+            "author": comment.author,
+            "text": comment.text,
+            "created_date": comment.created_date.isoformat(),
+        }
+    )
+    spool = _queue_dir() / SPOOL_NAME
+    while True:
+        fd = os.open(spool, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # the worker may have moved the file while we waited for the lock
+            if os.path.exists(spool) and os.fstat(fd).st_ino == os.stat(spool).st_ino:
+                os.write(fd, (line + "\n").encode())
+                return
+        finally:
+            os.close(fd)
+
+
+def _claim_spool():
+    """
+    Moves the current spool file aside for processing and returns the files to process,
+    including any left behind by an earlier run.
+    """
+    import fcntl
+
+    queue_dir = _queue_dir()
+    spool = queue_dir / SPOOL_NAME
+    if spool.exists():
+        fd = os.open(spool, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            target = queue_dir / f"{SPOOL_NAME}.{timezone.now():%Y%m%d%H%M%S%f}{PROCESSING_SUFFIX}"
+            os.rename(spool, target)
+        finally:
+            os.close(fd)
+    return sorted(queue_dir.glob(f"*{PROCESSING_SUFFIX}"))
+
+
+def _parse_comment(line):
+    """
+    Returns the comment queued as `line`, or raises ValueError if it isn't a valid one.
+    """
+    try:
+        entry = json.loads(line)
+        comment = Comment(
+            post_id=int(entry["post"]),
+            author=entry["author"],
+            text=entry["text"],
+            created_date=parse_datetime(entry["created_date"]),
+        )
+        # the post is checked when the batch is inserted
+        comment.full_clean(exclude=["post"])
+    except (KeyError, TypeError, ValidationError) as e:
+        raise ValueError(e) from e
+    return comment
+
+
+def _read_comments(path):
+    """
+    Yields the comments queued in `path`, moving the lines that aren't valid comments to the
+    dead-letter file.
+    """
+    with open(path) as spool:
+        for line in spool:
+            try:
+                yield _parse_comment(line)
+            except ValueError:
+                with open(_queue_dir() / DEAD_LETTER_NAME, "a") as dead_letters:
+                    dead_letters.write(line if line.endswith("\n") else line + "\n")
+
+
+def _insert(batch):
+    post_ids = {comment.post_id for comment in batch}
+    # posts deleted since the comment was queued
+    existing = set(Post.objects.filter(pk__in=post_ids).values_list("pk", flat=True))
+    batch = [comment for comment in batch if comment.post_id in existing]
+    with transaction.atomic():
+        Comment.objects.bulk_create(batch)
+        # bulk_create sends no post_save signals, so do their work once per post
+        Post.objects.filter(pk__in=existing).update(modified_date=timezone.now())
+    for post_id in existing:
+        invalidate_post(post_id, post_list=False)
+    return len(batch)
+
+
+def process_queue(batch_size=500):
+    """
+    Inserts every queued comment, `batch_size` at a time. Returns the number inserted.
+    """
+    inserted = 0
+    for path in _claim_spool():
+        batch = []
+        for comment in _read_comments(path):
+            batch.append(comment)
+            if len(batch) >= batch_size:
+                inserted += _insert(batch)
+                batch = []
+        if batch:
+            inserted += _insert(batch)
+        path.unlink()
+    return inserted
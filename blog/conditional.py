@@ -0,0 +1,83 @@
+"""
+ETag and Last-Modified functions for `django.views.decorators.http.condition`, so unchanged
+pages can be answered with a 304 without rendering any templates.
+
+The post list only has an ETag: deleting or unpublishing a post leaves no date behind on the
+remaining ones, so no Last-Modified can follow it, but it does change the count of posts.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.db.models.functions import Greatest
+
+from .models import Post, publish_cutoff
+
+
+def _viewer(request):
+    # the page header differs for each logged-in user
+    return str(request.user.pk) if request.user.is_authenticated else "anonymous"
+
+
+def _etag(*parts):
+    return hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _post_list_state(request):
+    """
+    Returns when the set of published posts last changed and how many there are, computed
+    once per request. A scheduled post changes the list when it goes live, at `published_date`.
+    """
+    if not hasattr(request, "_blog_post_list_state"):
+        request._blog_post_list_state = Post.published.aggregate(
+            last_modified=Max(Greatest("modified_date", "published_date")),
+            count=Count("pk"),
+        )
+    return request._blog_post_list_state
+
+
+def post_list_updated(request):
+    """
+    Returns when a published post was last added or edited, for the `updated` date of feeds.
+    """
+    return _post_list_state(request)["last_modified"]
+
+
+def post_list_etag(request, *args, **kwargs):
+    state = _post_list_state(request)
+    if state["last_modified"] is None:
+        return None
+    return _etag(
+        state["last_modified"].isoformat(),
+        state["count"],
+        request.get_full_path(),
+        _viewer(request),
+    )
+
+
+def _post_detail_state(request, pk):
+    if not hasattr(request, "_blog_post_detail_state"):
+        request._blog_post_detail_state = (
+            Post.objects.filter(pk=pk).values("modified_date", "published_date").first()
+        )
+    return request._blog_post_detail_state
+
+
+def post_detail_last_modified(request, pk, *args, **kwargs):
+    state = _post_detail_state(request, pk)
+    if state is None:
+        return None
+    # drafts and scheduled posts are a 404 for anonymous users, so leave those to the view
+    published_date = state["published_date"]
+    if not request.user.is_authenticated and (
+        published_date is None or published_date > publish_cutoff()
+    ):
+        return None
+    return state["modified_date"]
+
+
+def post_detail_etag(request, pk, *args, **kwargs):
+    last_modified = post_detail_last_modified(request, pk)
+    if last_modified is None:
+        return None
+    return _etag(last_modified.isoformat(), request.get_full_path(), _viewer(request))
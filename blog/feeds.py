@@ -0,0 +1,200 @@
+"""
+Atom, RSS and JSON Feed documents of the latest published posts.
+
+`stream_feed()` yields a feed a piece at a time, for a `StreamingHttpResponse`. The XML feeds
+are written by `django.utils.feedgenerator`. Each post's serialized entry is cached in the
+`BLOG_FRAGMENT_CACHE_ALIAS` cache under the post's id, `modified_date` and author, so
+regenerating a feed only serializes the posts that are new or edited since, and edits need no
+invalidation.
+"""
+
+import hashlib
+import json
+import re
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template import defaultfilters
+from django.utils import feedgenerator
+from django.utils.html import escape
+from django.utils.xmlutils import SimplerXMLGenerator
+
+TITLE = "Django Girls Blog"
+
+# characters XML 1.0 can't hold, which SimplerXMLGenerator refuses to write
+XML_ILLEGAL_CHARACTERS = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F]")
+
+
+def xml_text(value):
+    return XML_ILLEGAL_CHARACTERS.sub("", value)
+
+
+class AtomGenerator(feedgenerator.Atom1Feed):
+    """
+    Atom with the post's excerpt as the summary and its whole text as the content.
+    """
+
+    def latest_post_date(self):
+        return self.feed["updated"]
+
+    def add_item_elements(self, handler, item):
+        super().add_item_elements(handler, item)
+        handler.addQuickElement("content", item["content"], {"type": "html"})
+
+
+class RSSGenerator(feedgenerator.Rss201rev2Feed):
+    def latest_post_date(self):
+        return self.feed["updated"]
+
+    def add_item_elements(self, handler, item):
+        # RSS has no content element, so the description carries the whole post
+        super().add_item_elements(handler, {**item, "description": item["content"]})
+
+
+class XMLFeed:
+    """
+    A feed written by the feedgenerator class `generator`, whose entries are `item_element`
+    elements inserted before the `closing` tag of an empty feed.
+    """
+
+    separator = ""
+
+    def __init__(self, name, generator, item_element, closing):
+        self.name = name
+        self.generator = generator
+        self.content_type = generator.content_type
+        self.item_element = item_element
+        self.closing = closing
+
+    def document(self, feed):
+        return self.generator(
+            title=xml_text(feed["title"]),
+            link=feed["link"],
+            description=xml_text(feed["title"]),
+            feed_url=feed["feed_url"],
+            updated=feed["updated"],
+        )
+
+    def split(self, feed):
+        text = self.document(feed).writeString("utf-8")
+        position = text.rindex(self.closing)
+        return text[:position], text[position:] + "\n"
+
+    def head(self, feed):
+        return self.split(feed)[0]
+
+    def entry(self, feed, post):
+        url = post_url(feed, post)
+        document = self.document(feed)
+        document.add_item(
+            title=xml_text(post.title),
+            link=url,
+            unique_id=url,
+            unique_id_is_permalink=True,
+            description=escape(xml_text(post.excerpt)),
+            content=text_html(xml_text(post.text)),
+            author_name=xml_text(post.author.get_username()),
+            pubdate=post.published_date,
+            updateddate=post.modified_date,
+        )
+        item = document.items[0]
+        out = StringIO()
+        handler = SimplerXMLGenerator(out, "utf-8", short_empty_elements=True)
+        handler.startElement(self.item_element, document.item_attributes(item))
+        document.add_item_elements(handler, item)
+        handler.endElement(self.item_element)
+        return out.getvalue()
+
+    def tail(self, feed):
+        return self.split(feed)[1]
+
+
+class JSONFeed:
+    name = "json"
+    content_type = "application/feed+json; charset=utf-8"
+    separator = ","
+
+    def head(self, feed):
+        header = json.dumps(
+            {
+                "version": "https://jsonfeed.org/version/1.1",
+                "title": feed["title"],
+                "home_page_url": feed["link"],
+                "feed_url": feed["feed_url"],
+            }
+        )
+        # leave the object open for the items
+        return header[:-1] + ', "items": ['
+
+    def entry(self, feed, post):
+        url = post_url(feed, post)
+        return json.dumps(
+            {
+                "id": url,
+                "url": url,
+                "title": post.title,
+                "summary": post.excerpt,
+                "content_html": text_html(post.text),
+                "date_published": feedgenerator.rfc3339_date(post.published_date),
+                "date_modified": feedgenerator.rfc3339_date(post.modified_date),
+                "authors": [{"name": post.author.get_username()}],
+            }
+        )
+
+    def tail(self, feed):
+        return "]}\n"
+
+
+FEED_FORMATS = {
+    feed_format.name: feed_format
+    for feed_format in (
+        XMLFeed("atom", AtomGenerator, "entry", "</feed>"),
+        XMLFeed("rss", RSSGenerator, "item", "</channel>"),
+        JSONFeed(),
+    )
+}
+
+
+def post_url(feed, post):
+    return feed["site"] + post.get_absolute_url().lstrip("/")
+
+
+def text_html(text):
+    return defaultfilters.linebreaksbr(text, autoescape=True)
+
+
+def _entry_key(feed_format, feed, post):
+    # entries hold absolute URLs and the author's name, so each site the feed is served under
+    # and each name the author goes by has its own
+    variant = hashlib.md5(f"{feed['site']}\n{post.author.get_username()}".encode()).hexdigest()
+    return f"blog:feed:{feed_format.name}:{variant}:{post.pk}:{post.modified_date.timestamp()}"
+
+
+def feed_entries(feed_format, feed, posts):
+    """
+    Yields the serialized entry of each post in `posts`, from the cache where it's there.
+    """
+    cache = caches[settings.BLOG_FRAGMENT_CACHE_ALIAS]
+    keys = [_entry_key(feed_format, feed, post) for post in posts]
+    cached = cache.get_many(keys)
+    for key, post in zip(keys, posts):
+        entry = cached.get(key)
+        if entry is None:
+            entry = feed_format.entry(feed, post)
+            cache.set(key, entry, settings.BLOG_FRAGMENT_CACHE_TIMEOUT)
+        yield entry
+
+
+def stream_feed(feed_format, feed, posts):
+    """
+    Yields the feed document in pieces. `feed` has the feed's `title`, the `site` root URL, the
+    `link` to the post list, the `feed_url` and when it was last `updated`. `posts` must be
+    fetched with their authors, as nothing is queried while streaming.
+    """
+    yield feed_format.head(feed)
+    for number, entry in enumerate(feed_entries(feed_format, feed, posts)):
+        if number:
+            yield feed_format.separator
+        yield entry
+    yield feed_format.tail(feed)
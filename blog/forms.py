@@ -1,4 +1,5 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
 from .models import Comment, Post
 
@@ -19,3 +20,46 @@ class CommentForm(forms.ModelForm):
             "author",
             "text",
         )
+
+
+class CommentIdsField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise ValidationError("Enter a list of comment ids.", code="invalid")
+
+
+class CommentModerationForm(forms.Form):
+    """
+    Selects comments to approve or remove, either by id or by filter.
+    """
+
+    action = forms.ChoiceField(choices=[("approve", "Approve"), ("remove", "Remove")])
+    comment = CommentIdsField(required=False)
+    post = forms.IntegerField(required=False)
+    author = forms.CharField(required=False)
+    text_contains = forms.CharField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(
+            cleaned_data.get(name) for name in ("comment", "post", "author", "text_contains")
+        ):
+            # never act on every comment by accident
+            raise ValidationError("Select some comments or give a filter.", code="no_selection")
+        return cleaned_data
+
+    def get_queryset(self):
+        comments = Comment.objects.all()
+        if self.cleaned_data["comment"]:
+            comments = comments.filter(pk__in=self.cleaned_data["comment"])
+        if self.cleaned_data["post"] is not None:
+            comments = comments.filter(post=self.cleaned_data["post"])
+        if self.cleaned_data["author"]:
+            comments = comments.filter(author=self.cleaned_data["author"])
+        if self.cleaned_data["text_contains"]:
+            comments = comments.filter(text__icontains=self.cleaned_data["text_contains"])
+        return comments
@@ -0,0 +1,181 @@
+"""
+Per-request performance measurements, collected by `PerformanceMiddleware`.
+
+While a request is handled its `RequestTimings` sit in a context variable. Queries are
+timed by an execute wrapper that the `connection_created` handler in `blog.signals` installs
+on every connection. Template rendering is timed by the `TimedDjangoTemplates` backend.
+Because context variables follow a request into `sync_to_async` threads, queries run by the
+async views are counted too.
+
+Finished requests are added to histograms kept per URL name in this process. `metrics_text()`
+renders them in the Prometheus text format.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+_timings = ContextVar("blog_request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+@contextmanager
+def timed_request():
+    """
+    Collects query and template timings for the code run inside the block.
+    Yields the `RequestTimings`.
+    """
+    timings = RequestTimings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper that adds each query's time to the current request's timings.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_time += time.perf_counter() - start
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timings = _timings.get()
+        if timings is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timings.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing each top-level render for the current request.
+    Templates included from another template are counted as part of it.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    """
+    A Prometheus-style histogram: cumulative counts of observations at or below each bucket
+    bound, plus their sum and count.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (help text, buckets)
+METRICS = {
+    "blog_request_duration_seconds": ("Wall time spent handling the request.", SECONDS_BUCKETS),
+    "blog_db_queries": ("Database queries run for the request.", (0, 1, 2, 5, 10, 20, 50, 100)),
+    "blog_db_duration_seconds": ("Time spent in database queries.", SECONDS_BUCKETS),
+    "blog_template_duration_seconds": ("Time spent rendering templates.", SECONDS_BUCKETS),
+    "blog_response_size_bytes": (
+        "Size of the response body, for non-streaming responses.",
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576),
+    ),
+}
+
+_histograms = {}
+_lock = threading.Lock()
+
+
+def observe(view_name, values):
+    """
+    Adds one request's measurements, a dict of metric name to value, to the histograms for
+    `view_name`.
+    """
+    with _lock:
+        for name, value in values.items():
+            key = (name, view_name)
+            if key not in _histograms:
+                _histograms[key] = Histogram(METRICS[name][1])
+            _histograms[key].observe(value)
+
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def metrics_text():
+    """
+    Returns the histograms in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for name, (help_text, _) in METRICS.items():
+            views = sorted(view for metric, view in _histograms if metric == name)
+            if not views:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for view in views:
+                histogram = _histograms[(name, view)]
+                label = f'view="{_label(view)}"'
+                for bound, count in histogram.cumulative_counts():
+                    lines.append(f'{name}_bucket{{{label},le="{_number(bound)}"}} {count}')
+                lines.append(f"{name}_sum{{{label}}} {_number(histogram.sum)}")
+                lines.append(f"{name}_count{{{label}}} {histogram.count}")
+    return "\n".join(lines) + "\n"
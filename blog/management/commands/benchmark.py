@@ -0,0 +1,216 @@
+import json
+import platform
+import subprocess
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+from blog.benchmark import (
+    DEFAULT_MIX,
+    PASSWORD,
+    read_trace,
+    scratch_database,
+    seed_database,
+    summarise,
+    synthetic_trace,
+    write_trace,
+)
+from blog.cache import page_cache
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX or not weight.isdigit():
+            raise ValueError(f"Invalid mix entry: {part!r}")
+        mix[kind] = int(weight)
+    return mix
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=settings.BASE_DIR
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a scratch database, replays a JSONL request trace (or a synthetic mix of "
+        "list/detail/comment/publish requests) through the test client, and reports "
+        "throughput, latency percentiles and queries per request for each endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5, help="Number of users to seed.")
+        parser.add_argument("--posts", type=int, default=50, help="Number of posts to seed.")
+        parser.add_argument(
+            "--comments", type=int, default=20, help="Number of comments to seed on each post."
+        )
+        parser.add_argument(
+            "--drafts", type=int, default=10, help="Number of unpublished posts to seed."
+        )
+        parser.add_argument("--trace", help="JSONL file of requests to replay.")
+        parser.add_argument(
+            "--requests", type=int, default=1000, help="Length of the synthetic trace."
+        )
+        parser.add_argument(
+            "--mix",
+            type=_parse_mix,
+            default=DEFAULT_MIX,
+            help="Weights of the synthetic trace, e.g. list=60,detail=30,comment=8,publish=2.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed for the synthetic trace."
+        )
+        parser.add_argument("--save-trace", help="Write the replayed trace to this JSONL file.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--compare", help="Results file from an earlier run to report the changes against."
+        )
+        parser.add_argument(
+            "--page-cache",
+            action="store_true",
+            help="Leave the anonymous page cache on, so repeated pages are cache hits.",
+        )
+
+    def handle(self, *args, **options):
+        page_cache_settings = {} if options["page_cache"] else {"BLOG_PAGE_CACHE_TIMEOUT": 0}
+        with scratch_database(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], **page_cache_settings
+        ):
+            page_cache().clear()
+            published, drafts = seed_database(
+                users=options["users"],
+                posts=options["posts"],
+                comments=options["comments"],
+                drafts=options["drafts"],
+            )
+            if options["trace"]:
+                trace = read_trace(options["trace"])
+            else:
+                trace = synthetic_trace(
+                    options["requests"], published, drafts, options["mix"], options["seed"]
+                )
+            if options["save_trace"]:
+                write_trace(options["save_trace"], trace)
+            results = self.replay(trace)
+
+        results["run"] = {
+            "date": timezone.now().isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "trace": options["trace"] or "synthetic",
+            "users": options["users"],
+            "posts": options["posts"],
+            "comments": options["comments"],
+            "page_cache": options["page_cache"],
+        }
+        self.report(results)
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                self.compare(json.load(f), results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def replay(self, trace):
+        """
+        Sends each request in `trace` and returns the summary for each endpoint and overall.
+        """
+        client = Client()
+        logged_in = None
+        latencies = defaultdict(list)
+        queries = defaultdict(list)
+        errors = defaultdict(int)
+
+        start = time.perf_counter()
+        for number, entry in enumerate(trace, start=1):
+            try:
+                path = entry["path"]
+                method = entry.get("method", "GET").upper()
+                if method not in METHODS:
+                    raise KeyError(f"unsupported method {method}")
+                endpoint = resolve(path.partition("?")[0]).view_name
+            except (KeyError, Resolver404) as e:
+                raise CommandError(f"Invalid trace entry {number}: {entry!r} ({e})")
+            user = entry.get("user")
+            if user != logged_in:
+                client.logout()
+                if user and not client.login(username=user, password=PASSWORD):
+                    raise CommandError(f"Unknown user in trace entry {number}: {user}")
+                logged_in = user
+
+            with ExitStack() as stack:
+                captured = [
+                    stack.enter_context(CaptureQueriesContext(connections[alias]))
+                    for alias in ["default", *settings.BLOG_READ_REPLICAS]
+                ]
+                request_start = time.perf_counter()
+                response = getattr(client, method.lower())(path, entry.get("data"))
+                latency = time.perf_counter() - request_start
+            latencies[endpoint].append(latency)
+            queries[endpoint].append(sum(len(context) for context in captured))
+            if response.status_code >= 400:
+                errors[endpoint] += 1
+        elapsed = time.perf_counter() - start
+
+        endpoints = {}
+        for endpoint in sorted(latencies):
+            endpoints[endpoint] = {
+                **summarise(latencies[endpoint]),
+                "errors": errors[endpoint],
+                "queries_mean": sum(queries[endpoint]) / len(queries[endpoint]),
+                "queries_max": max(queries[endpoint]),
+            }
+        all_queries = [count for counts in queries.values() for count in counts]
+        total = {
+            **summarise([latency for values in latencies.values() for latency in values], elapsed),
+            "errors": sum(errors.values()),
+            "queries_mean": sum(all_queries) / len(all_queries) if all_queries else 0,
+        }
+        return {"endpoints": endpoints, "total": total}
+
+    def report(self, results):
+        rows = [*results["endpoints"].items(), ("total", results["total"])]
+        width = max(len(name) for name, _ in rows)
+        for name, result in rows:
+            if not result["requests"]:
+                continue
+            self.stdout.write(
+                f"{name:<{width}} {result['requests']:6d} req {result['rps']:9.1f} req/s "
+                f"p50 {result['p50_ms']:7.2f} ms p90 {result['p90_ms']:7.2f} ms "
+                f"p99 {result['p99_ms']:7.2f} ms {result['queries_mean']:6.1f} queries "
+                f"{result['errors']:5d} errors"
+            )
+
+    def compare(self, baseline, results):
+        """
+        Reports the change in p50 and p99 latency and in queries per request for each endpoint
+        that was in both runs.
+        """
+        self.stdout.write(f"compared with {baseline['run'].get('git_commit') or 'baseline'}:")
+        before_endpoints = {**baseline["endpoints"], "total": baseline["total"]}
+        after_endpoints = {**results["endpoints"], "total": results["total"]}
+        for name, after in after_endpoints.items():
+            before = before_endpoints.get(name)
+            if not before or not before["requests"] or not after["requests"]:
+                continue
+            p50 = (after["p50_ms"] / before["p50_ms"] - 1) * 100
+            p99 = (after["p99_ms"] / before["p99_ms"] - 1) * 100
+            queries = after["queries_mean"] - before["queries_mean"]
+            self.stdout.write(f"{name}: p50 {p50:+6.1f}% p99 {p99:+6.1f}% {queries:+.1f} queries")
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import include, path
+
+import mysite.urls
+from blog import urls as blog_urls
+from blog.benchmark import scratch_database, seed_database, summarise
+
+HOST = "127.0.0.1"
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
+
+
+def _urlconf(blog_patterns):
+    """
+    Returns a URLconf serving `blog_patterns` alongside the project's other URLs.
+    """
+    project_patterns = [
+        pattern for pattern in mysite.urls.urlpatterns if getattr(pattern, "name", None)
+    ]
+
+    class URLConf:
+        urlpatterns = project_patterns + [path("", include((blog_patterns, "blog")))]
+
+    return URLConf
+
+
+async def _get(application, path):
+    """
+    Sends a GET for `path` straight to `application` and returns the response status.
+    """
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", HOST.encode())],
+        "client": ("127.0.0.1", 0),
+        "server": (HOST, 80),
+    }
+    finished = asyncio.Event()
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not message.get("more_body"):
+            finished.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures latency and throughput of the post list, post detail and comment pages "
+        "served over ASGI by the sync views and by the async views, on a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=_positive_int, default=500, help="Requests per endpoint."
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=_positive_int,
+            default=20,
+            help="Number of requests in flight at once.",
+        )
+        parser.add_argument(
+            "--posts", type=_positive_int, default=50, help="Number of posts to seed."
+        )
+        parser.add_argument(
+            "--comments", type=int, default=20, help="Number of comments to seed on each post."
+        )
+        parser.add_argument(
+            "--page-cache",
+            action="store_true",
+            help="Leave the anonymous page cache on, so most requests are cache hits.",
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            endpoints = self.seed(options["posts"], options["comments"])
+            page_cache_settings = {} if options["page_cache"] else {"BLOG_PAGE_CACHE_TIMEOUT": 0}
+            for label, patterns in (
+                ("sync", blog_urls.sync_urlpatterns),
+                ("async", blog_urls.async_urlpatterns),
+            ):
+                with override_settings(
+                    ROOT_URLCONF=_urlconf(patterns), ALLOWED_HOSTS=[HOST], **page_cache_settings
+                ):
+                    application = get_asgi_application()
+                    for name, paths in endpoints.items():
+                        result = asyncio.run(self.run_benchmark(application, paths, options))
+                        if not result["requests"]:
+                            continue
+                        self.stdout.write(
+                            f"{label:>6} {name:<8}: p50 {result['p50_ms']:8.2f} ms "
+                            f"p99 {result['p99_ms']:8.2f} ms {result['rps']:10.1f} req/s "
+                            f"{result['errors']:6d} errors"
+                        )
+
+    def seed(self, posts, comments):
+        """
+        Seeds the database and returns the paths to request for each endpoint.
+        """
+        published, _ = seed_database(users=1, posts=posts, comments=comments)
+        return {
+            "list": [f"/?page={number % (posts // 2 or 1) + 1}" for number in range(posts)],
+            "detail": [f"/{post.pk}/" for post in published],
+            "comment": [f"/post/{post.pk}/comment/" for post in published],
+        }
+
+    async def run_benchmark(self, application, paths, options):
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for number in range(options["requests"]):
+            queue.put_nowait(paths[number % len(paths)])
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                status = await _get(application, path)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+        return {**summarise(latencies, time.perf_counter() - start), "errors": errors}
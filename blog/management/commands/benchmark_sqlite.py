@@ -0,0 +1,116 @@
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.sqlite import apply_pragmas
+
+SCHEMA = """
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    approved INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX comment_post ON comment (post_id, approved);
+"""
+
+# what a connection gets without any tuning: Django's default 5 second lock timeout
+DEFAULT_PRAGMAS = {"busy_timeout": 5000}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures concurrent read/write throughput on a scratch SQLite database, with the "
+        "default settings and with BLOG_SQLITE_PRAGMAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=5.0, help="Length of each run.")
+        parser.add_argument("--readers", type=int, default=4, help="Number of reader threads.")
+        parser.add_argument("--writers", type=int, default=2, help="Number of writer threads.")
+        parser.add_argument("--posts", type=int, default=100, help="Number of posts to seed.")
+
+    def handle(self, *args, **options):
+        for label, pragmas in (
+            ("default", DEFAULT_PRAGMAS),
+            ("tuned", settings.BLOG_SQLITE_PRAGMAS),
+        ):
+            with tempfile.TemporaryDirectory() as tmp:
+                result = self.run_benchmark(Path(tmp) / "bench.sqlite3", pragmas, options)
+            self.stdout.write(
+                f"{label:>8}: {result['reads'] / options['seconds']:10.1f} reads/s "
+                f"{result['writes'] / options['seconds']:10.1f} writes/s "
+                f"{result['errors']:6d} lock errors"
+            )
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, timeout=0, isolation_level=None)
+        apply_pragmas(connection.cursor(), pragmas)
+        return connection
+
+    def run_benchmark(self, path, pragmas, options):
+        setup = self.connect(path, pragmas)
+        setup.executescript(SCHEMA)
+        setup.executemany(
+            "INSERT INTO comment (post_id, text, approved) VALUES (?, ?, 1)",
+            [
+                (post_id % options["posts"], "seed comment")
+                for post_id in range(10 * options["posts"])
+            ],
+        )
+        setup.close()
+
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["seconds"]
+
+        def reader(n):
+            connection = self.connect(path, pragmas)
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute(
+                        "SELECT id, text FROM comment WHERE post_id = ? AND approved = 1",
+                        (done % options["posts"],),
+                    ).fetchall()
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+            connection.close()
+            with lock:
+                counts["reads"] += done
+                counts["errors"] += errors
+
+        def writer(n):
+            connection = self.connect(path, pragmas)
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                    connection.execute(
+                        "INSERT INTO comment (post_id, text) VALUES (?, ?)",
+                        (done % options["posts"], f"comment {n}-{done}"),
+                    )
+                    connection.execute("COMMIT")
+                    done += 1
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    errors += 1
+            connection.close()
+            with lock:
+                counts["writes"] += done
+                counts["errors"] += errors
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(options["readers"])]
+        threads += [threading.Thread(target=writer, args=(n,)) for n in range(options["writers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
@@ -0,0 +1,116 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import RequestContext
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.utils import timezone
+
+from blog.benchmark import summarise
+from blog.forms import CommentForm
+from blog.models import Comment, Post
+from blog.template_cache import template_names
+
+DIRECTORY_LOADERS = [
+    "django.template.loaders.filesystem.Loader",
+    "django.template.loaders.app_directories.Loader",
+]
+
+# name: (debug, loaders)
+PROFILES = {
+    "uncached+debug": (True, DIRECTORY_LOADERS),
+    "cached": (False, [("django.template.loaders.cached.Loader", DIRECTORY_LOADERS)]),
+}
+
+
+def sample_context(posts=10, comments=20):
+    """
+    Returns a context with unsaved objects that every blog template can be rendered with.
+    """
+    author = User(id=1, username="author")
+    now = timezone.now()
+    post_list = []
+    for number in range(1, posts + 1):
+        post = Post(
+            id=number,
+            author=author,
+            title=f"Post {number}",
+            text="Some post text.\n\n" * 20,
+            published_date=now - datetime.timedelta(hours=number),
+        )
+        post.excerpt = post.text[:200]
+        post.num_approved_comments = comments
+        post_list.append(post)
+    comment_list = [
+        Comment(
+            id=number,
+            post=post_list[0],
+            author="reader",
+            text=f"Comment {number}",
+            created_date=now,
+            approved_comment=True,
+        )
+        for number in range(1, comments + 1)
+    ]
+    page = Paginator(post_list, 2).page(1)
+    return {
+        "post": post_list[0],
+        "object": post_list[0],
+        "page_obj": page,
+        "paginator": page.paginator,
+        "post_list": page.object_list,
+        "is_paginated": True,
+        "comments": comment_list,
+        "form": CommentForm(),
+        "query": "post",
+        "results": [],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the render time of each template in blog/templates with the cached loader "
+        "and template debugging off, against the uncached loader with debugging on."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=200, help="Renders of each template per profile."
+        )
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        context = sample_context()
+        template_options = settings.TEMPLATES[0]["OPTIONS"]
+        engines = {
+            label: DjangoTemplates(
+                {
+                    "NAME": label,
+                    "DIRS": [],
+                    "APP_DIRS": False,
+                    "OPTIONS": {**template_options, "debug": debug, "loaders": loaders},
+                }
+            ).engine
+            for label, (debug, loaders) in PROFILES.items()
+        }
+        for name in template_names():
+            results = {}
+            for label, engine in engines.items():
+                latencies = []
+                for _ in range(options["iterations"]):
+                    start = time.perf_counter()
+                    engine.get_template(name).render(RequestContext(request, context))
+                    latencies.append(time.perf_counter() - start)
+                results[label] = summarise(latencies)
+            self.stdout.write(
+                f"{name:<36}"
+                + "".join(
+                    f" {label} p50 {result['p50_ms'] * 1000:8.1f} us"
+                    for label, result in results.items()
+                )
+            )
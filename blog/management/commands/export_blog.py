@@ -0,0 +1,37 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.backup import export_records
+
+
+class Command(BaseCommand):
+    help = "Writes every post and comment to a newline-delimited JSON file, for import_blog."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", default="-", help="File to write to, or - for standard output."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=2000, help="Number of rows to read at a time."
+        )
+
+    def handle(self, *args, **options):
+        if options["output"] == "-":
+            self.write(sys.stdout, options["batch_size"])
+        else:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                self.write(f, options["batch_size"])
+
+    def write(self, f, batch_size):
+        counts = {"post": 0, "comment": 0}
+        for record in export_records(batch_size=batch_size):
+            f.write(json.dumps(record) + "\n")
+            counts[record["model"]] += 1
+            if sum(counts.values()) % batch_size == 0:
+                self.stderr.write(self.progress(counts), ending="\r")
+        self.stderr.write(self.style.SUCCESS(self.progress(counts)))
+
+    def progress(self, counts):
+        return f"Exported {counts['post']} posts and {counts['comment']} comments"
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.static_site import export_site
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the post list and every published post's detail page to HTML files for a "
+        "static file server. After the first export only the pages that changed are rendered."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.BLOG_STATIC_SITE_ROOT,
+            help="Directory to write the pages to.",
+        )
+        parser.add_argument(
+            "--full", action="store_true", help="Render every page, not just the changed ones."
+        )
+
+    def handle(self, *args, **options):
+        if settings.BLOG_CURSOR_PAGINATION:
+            raise CommandError(
+                "The static export needs numbered pages; turn off BLOG_CURSOR_PAGINATION."
+            )
+        written, removed = export_site(options["output"], full=options["full"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {written} pages and removed {removed} to {options['output']}"
+            )
+        )
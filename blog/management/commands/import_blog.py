@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from blog.backup import import_records
+from blog.cache import invalidate_post
+from blog.search import search_available
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports posts and comments from a newline-delimited JSON file written by export_blog, "
+        "keeping their ids, then rebuilds the comment counts and the search index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="File to read, or - for standard input.")
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Number of rows to insert at a time."
+        )
+
+    def handle(self, *args, **options):
+        post_ids = set()
+        try:
+            if options["input"] == "-":
+                self.read(sys.stdin, options["batch_size"], post_ids)
+            else:
+                with open(options["input"], encoding="utf-8") as f:
+                    self.read(f, options["batch_size"], post_ids)
+        finally:
+            # the batches before an error stay imported, so bring everything derived from
+            # them up to date either way
+            if post_ids:
+                call_command("rebuild_comment_counts", stdout=self.stdout)
+                if search_available():
+                    call_command("rebuild_search_index", stdout=self.stdout)
+                for pk in post_ids:
+                    invalidate_post(pk, post_list=False)
+
+    def read(self, f, batch_size, post_ids):
+        counts = {"post": 0, "comment": 0}
+        try:
+            for counts in import_records(f, batch_size=batch_size, post_ids=post_ids):
+                self.stdout.write(self.progress(counts), ending="\r")
+        except ValueError as e:
+            raise CommandError(f"{e} ({self.progress(counts)} before it)") from e
+        except IntegrityError as e:
+            raise CommandError(
+                f"{e}: a post or comment clashes with an existing one, or a comment's post is "
+                f"missing ({self.progress(counts)} before it)"
+            ) from e
+        self.stdout.write(self.style.SUCCESS(self.progress(counts)))
+
+    def progress(self, counts):
+        return f"Imported {counts['post']} posts and {counts['comment']} comments"
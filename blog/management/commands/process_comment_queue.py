@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.comment_queue import process_queue, queue_enabled
+
+
+class Command(BaseCommand):
+    help = "Inserts comments queued by add_comment_to_post when BLOG_COMMENT_QUEUE_DIR is set."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Number of comments per INSERT."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=1.0, help="Seconds to wait between runs."
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+
+    def handle(self, *args, **options):
+        if not queue_enabled():
+            raise CommandError("BLOG_COMMENT_QUEUE_DIR is not set.")
+        while True:
+            inserted = process_queue(batch_size=options["batch_size"])
+            if inserted:
+                self.stdout.write(f"Inserted {inserted} comments")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
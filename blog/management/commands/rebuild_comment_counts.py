@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.cache import invalidate_post_list
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recalculates the denormalized Post.approved_comment_count column."
+
+    def handle(self, *args, **options):
+        updated = Post.objects.update_approved_comment_counts()
+        invalidate_post_list()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt approved comment counts for {updated} posts")
+        )
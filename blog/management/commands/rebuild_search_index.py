@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from all posts and approved comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Number of posts to index at a time."
+        )
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("Full-text search needs an SQLite database with FTS5.")
+        indexed = 0
+        for indexed in rebuild_index(batch_size=options["batch_size"]):
+            self.stdout.write(f"Indexed {indexed} posts", ending="\r")
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search index for {indexed} posts"))
@@ -0,0 +1,21 @@
+from urllib.error import URLError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.vendor import VENDORED_STYLESHEETS, vendor_stylesheet
+
+
+class Command(BaseCommand):
+    help = (
+        "Downloads the pinned Bootstrap, Bootstrap Icons and Lobster stylesheets and the files "
+        "they load into blog/static/vendor/. Commit them and run collectstatic."
+    )
+
+    def handle(self, *args, **options):
+        for path, (url, expected_integrity) in VENDORED_STYLESHEETS.items():
+            try:
+                saved = vendor_stylesheet(path, url, expected_integrity)
+            except (URLError, ValueError) as e:
+                raise CommandError(f"Couldn't vendor {url}: {e}") from e
+            self.stdout.write(f"Vendored {url} as {len(saved)} files")
+        self.stdout.write(self.style.SUCCESS("Vendored the stylesheets into blog/static/vendor/"))
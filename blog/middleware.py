@@ -0,0 +1,190 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.utils.cache import has_vary_header, patch_cache_control
+from django.utils.functional import SimpleLazyObject
+
+from . import user_cache
+from .instrumentation import observe, timed_request
+from .routers import replica_routing
+
+# set after a write so the browser's next requests read from the primary until the replicas
+# have caught up
+PRIMARY_COOKIE = "blog_primary"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends reads for safe requests to the read replicas, and keeps a browser on the primary
+    for `settings.BLOG_REPLICA_LAG_SECONDS` after it writes anything.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.BLOG_READ_REPLICAS:
+            return self.get_response(request)
+        with replica_routing(primary=self.use_primary(request)) as state:
+            response = self.get_response(request)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        if not settings.BLOG_READ_REPLICAS:
+            return await self.get_response(request)
+        with replica_routing(primary=self.use_primary(request)) as state:
+            response = await self.get_response(request)
+        return self.process_response(state, response)
+
+    def use_primary(self, request):
+        return request.method not in ("GET", "HEAD", "OPTIONS") or PRIMARY_COOKIE in request.COOKIES
+
+    def process_response(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                "1",
+                max_age=settings.BLOG_REPLICA_LAG_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class PerformanceMiddleware:
+    """
+    Measures each request's wall time, database queries and time, template render time and
+    response size. Adds them to the histograms for the resolved URL name, and sends them back
+    in a Server-Timing header when `settings.BLOG_SERVER_TIMING` is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.BLOG_METRICS:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with timed_request() as timings:
+            response = self.get_response(request)
+        return self.process_response(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not settings.BLOG_METRICS:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with timed_request() as timings:
+            response = await self.get_response(request)
+        return self.process_response(request, response, timings, time.perf_counter() - start)
+
+    def process_response(self, request, response, timings, duration):
+        match = request.resolver_match
+        values = {
+            "blog_request_duration_seconds": duration,
+            "blog_db_queries": timings.queries,
+            "blog_db_duration_seconds": timings.db_time,
+            "blog_template_duration_seconds": timings.template_time,
+        }
+        if not response.streaming:
+            values["blog_response_size_bytes"] = len(response.content)
+        observe(match.view_name if match else "unresolved", values)
+
+        if settings.BLOG_SERVER_TIMING:
+            response.headers["Server-Timing"] = ", ".join(
+                (
+                    f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+                    f"template;dur={timings.template_time * 1000:.1f}",
+                    f"total;dur={duration * 1000:.1f}",
+                )
+            )
+        return response
+
+
+class AnonymousFastPathMiddleware:
+    """
+    Makes GET and HEAD requests for the views in `settings.BLOG_ANONYMOUS_FAST_PATH_VIEWS`
+    from browsers without a session cookie cheap to serve and to cache: the user is anonymous
+    without reading the session or looking them up, so the response doesn't vary on Cookie,
+    and it gets a public Cache-Control header instead, so shared caches can store it. Shared
+    caches must pass requests that carry the session cookie through to the site.
+
+    The request still goes through all the middleware. A response that sets a cookie or
+    varies on Cookie anyway, e.g. because it rendered a CSRF token, isn't made public.
+
+    Goes before SessionMiddleware in `MIDDLEWARE`, and needs CachedAuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            settings.BLOG_ANONYMOUS_FAST_PATH
+            and request.method in ("GET", "HEAD")
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and request.resolver_match.view_name in settings.BLOG_ANONYMOUS_FAST_PATH_VIEWS
+        ):
+            # taken by CachedAuthenticationMiddleware's lazy user instead of the session's
+            request._cached_user = AnonymousUser()
+            request._blog_fast_path = True
+        return None
+
+    def process_response(self, request, response):
+        if (
+            getattr(request, "_blog_fast_path", False)
+            and response.status_code in (200, 304)
+            and not response.cookies
+            and not has_vary_header(response, "Cookie")
+            and not response.has_header("Cache-Control")
+        ):
+            patch_cache_control(
+                response, public=True, max_age=settings.BLOG_ANONYMOUS_CACHE_MAX_AGE
+            )
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that takes `request.user` from the user cache in
+    `blog.user_cache` instead of the database.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _cached_user(request))
+
+
+def _cached_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = user_cache.get_user(request)
+    return request._cached_user
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_approved_comment_count(apps, schema_editor):
+    Comment = apps.get_model("blog", "Comment")
+    Post = apps.get_model("blog", "Post")
+    approved = (
+        Comment.objects.filter(post=OuterRef("pk"), approved_comment=True)
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Post.objects.update(approved_comment_count=Coalesce(Subquery(approved), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0002_comment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="approved_comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_approved_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-17 00:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0003_post_approved_comment_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "approved_comment", "created_date"],
+                name="blog_comment_post_appr_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["published_date", "created_date"], name="blog_post_pub_created_idx"
+            ),
+        ),
+    ]
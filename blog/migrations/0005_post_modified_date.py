@@ -0,0 +1,24 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def backfill_modified_date(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Post.objects.update(modified_date=Coalesce("published_date", "created_date"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0004_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="modified_date",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_modified_date, migrations.RunPython.noop),
+    ]
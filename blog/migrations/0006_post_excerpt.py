@@ -0,0 +1,47 @@
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# copied from blog.models as it was when this migration was written, so later changes to it
+# don't change what the migration does
+EXCERPT_WORDS = 15
+EXCERPT_CHARS = 200
+
+
+def make_excerpt(text):
+    end = 0
+    for match, _ in zip(re.finditer(r"\S+", text), range(EXCERPT_WORDS + 1)):
+        end = match.end()
+    return text[: max(end, EXCERPT_CHARS + 1)]
+
+
+def backfill_excerpt(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    last_pk = 0
+    while True:
+        batch = list(
+            Post.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "text")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for post in batch:
+            post.excerpt = make_excerpt(post.text)
+        Post.objects.bulk_update(batch, ["excerpt"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0005_post_modified_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_excerpt, migrations.RunPython.noop),
+    ]
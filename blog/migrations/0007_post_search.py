@@ -0,0 +1,43 @@
+from django.db import migrations
+
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE blog_post_search USING fts5(
+    title, text, comments, tokenize = 'porter unicode61'
+)
+"""
+
+POPULATE_SEARCH_TABLE = """
+INSERT INTO blog_post_search (rowid, title, text, comments)
+SELECT p.id, p.title, p.text, COALESCE(
+    (
+        SELECT group_concat(c.text, char(10)) FROM blog_comment c
+        WHERE c.post_id = p.id AND c.approved_comment
+    ),
+    ''
+)
+FROM blog_post p
+"""
+
+
+def create_search_table(apps, schema_editor):
+    # FTS5 is SQLite only; search is unavailable on other databases
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(POPULATE_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE blog_post_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0006_post_excerpt"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -1,18 +1,149 @@
+import datetime
+import re
+
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 
 
+# list pages show the first EXCERPT_WORDS words of published posts and the first
+# EXCERPT_CHARS characters of drafts
+EXCERPT_WORDS = 15
+EXCERPT_CHARS = 200
+
+
+def make_excerpt(text):
+    """
+    Returns the start of `text`, long enough that truncating it to `EXCERPT_WORDS` words or
+    `EXCERPT_CHARS` characters gives the same result as truncating the whole text.
+    """
+    end = 0
+    # one word more than is shown, so truncatewords still knows the text was cut short
+    for match, _ in zip(re.finditer(r"\S+", text), range(EXCERPT_WORDS + 1)):
+        end = match.end()
+    return text[: max(end, EXCERPT_CHARS + 1)]
+
+
+def publish_cutoff(now=None):
+    """
+    Returns the current time rounded down to `settings.BLOG_PUBLISH_GRANULARITY` seconds.
+    Within one time bucket the published-posts query, and anything cached from it, stays the
+    same; a scheduled post shows up at the start of the first bucket after its publish date,
+    never before it.
+    """
+    now = now or timezone.now()
+    granularity = settings.BLOG_PUBLISH_GRANULARITY
+    if not granularity:
+        return now
+    timestamp = now.timestamp()
+    timestamp -= timestamp % granularity
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+
+
+class PostQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(published_date__lte=publish_cutoff())
+
+    def drafts(self):
+        return self.filter(published_date__isnull=True)
+
+    def update_approved_comment_counts(self, **fields):
+        """
+        Recounts the approved comments of every post in the queryset with a single UPDATE,
+        also setting `fields`. Returns the number of posts updated.
+        """
+        approved = (
+            Comment.objects.filter(post=OuterRef("pk"), approved_comment=True)
+            .order_by()
+            .values("post")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        return self.update(approved_comment_count=Coalesce(Subquery(approved), 0), **fields)
+
+    def next_scheduled_publish(self):
+        """
+        Returns when the next scheduled post will appear in `published()`, or None if no posts
+        are scheduled.
+        """
+        next_date = self.filter(published_date__gt=publish_cutoff()).aggregate(
+            next_date=Min("published_date")
+        )["next_date"]
+        if next_date is None:
+            return None
+        # the post is visible once the cutoff, rounded down, reaches its publish date
+        visible = publish_cutoff(next_date)
+        if visible < next_date:
+            visible += datetime.timedelta(seconds=settings.BLOG_PUBLISH_GRANULARITY)
+        return visible
+
+
+class PublishedPostManager(models.Manager.from_queryset(PostQuerySet)):
+    """
+    Manager for posts that are visible now. The publish time is worked out on every query,
+    so scheduled posts appear without a restart.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().published()
+
+
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
     text = models.TextField()
     created_date = models.DateTimeField(default=timezone.now)
     published_date = models.DateTimeField(blank=True, null=True)
+    # when the post or its comments last changed, for conditional GET
+    modified_date = models.DateTimeField(auto_now=True)
+    # denormalized copy of approved_comments().count(), kept up to date by the Comment signal
+    # handlers with UPDATE queries
+    approved_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # the start of `text`, enough to render list excerpts without loading the whole text
+    excerpt = models.TextField(blank=True, editable=False)
 
-    def publish(self, date=timezone.now()):
-        self.published_date = date
+    objects = PostQuerySet.as_manager()
+    published = PublishedPostManager()
+
+    class Meta:
+        indexes = [
+            # serves both the published list (range on published_date) and the
+            # draft list (published_date IS NULL ordered by created_date)
+            models.Index(
+                fields=["published_date", "created_date"], name="blog_post_pub_created_idx"
+            ),
+        ]
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        deferred = self.get_deferred_fields()
+        if "text" not in deferred:
+            self.excerpt = make_excerpt(self.text)
+        if not self._state.adding and not force_insert:
+            if update_fields is None:
+                # never write back a stale in-memory copy of the comment counter
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.name != "approved_comment_count"
+                    and field.attname not in deferred
+                ]
+            elif "text" in update_fields:
+                update_fields = {*update_fields, "excerpt"}
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields,
+        )
+
+    def publish(self, date=None):
+        # publishing now dates the post at the current cutoff, so it's visible straight away
+        self.published_date = date or publish_cutoff()
         self.save()
 
     def __str__(self):
@@ -32,9 +163,19 @@ class Comment(models.Model):
     created_date = models.DateTimeField(default=timezone.now)
     approved_comment = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "approved_comment", "created_date"],
+                name="blog_comment_post_appr_idx",
+            ),
+        ]
+
     def approve(self):
+        if self.approved_comment:
+            return
         self.approved_comment = True
-        self.save()
+        self.save(update_fields=["approved_comment"])
 
     def __str__(self):
         return self.text
@@ -0,0 +1,62 @@
+"""
+Bulk comment moderation.
+
+`approve_comments()` and `remove_comments()` act on a whole queryset of comments with a
+single UPDATE or DELETE, then bring the affected posts' comment counters, modified dates,
+cached pages and search index up to date once for the batch, rather than once per comment
+as the `Comment.approve()` / `Comment.delete()` signal handlers do.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_post, invalidate_post_list
+from .models import Comment, Post
+from .search import index_posts
+from .signals import bulk_comment_delete
+
+
+def _refresh_posts(post_ids):
+    Post.objects.filter(pk__in=post_ids).update_approved_comment_counts(
+        modified_date=timezone.now()
+    )
+
+
+def _after_commit(post_ids):
+    def update_caches():
+        for post_id in post_ids:
+            invalidate_post(post_id, post_list=False)
+        invalidate_post_list()
+        index_posts(post_ids)
+
+    transaction.on_commit(update_caches)
+
+
+def approve_comments(comments):
+    """
+    Approves every unapproved comment in the `comments` queryset. Returns how many were
+    approved.
+    """
+    with transaction.atomic():
+        pending = comments.filter(approved_comment=False)
+        post_ids = set(pending.values_list("post", flat=True).distinct())
+        approved = pending.update(approved_comment=True)
+        if approved:
+            _refresh_posts(post_ids)
+            _after_commit(post_ids)
+    return approved
+
+
+def remove_comments(comments):
+    """
+    Deletes every comment in the `comments` queryset. Returns how many were deleted.
+    """
+    with transaction.atomic():
+        post_ids = set(comments.values_list("post", flat=True).distinct())
+        with bulk_comment_delete():
+            _, removed = comments.delete()
+        removed = removed.get(Comment._meta.label, 0)
+        if removed:
+            _refresh_posts(post_ids)
+            _after_commit(post_ids)
+    return removed
@@ -0,0 +1,162 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(position):
+    """
+    Encodes a list of JSON-serializable values as an opaque, URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by `encode_cursor()`, raising `InvalidCursor` if it's malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("That cursor is not valid")
+    if not isinstance(position, list):
+        raise InvalidCursor("That cursor is not valid")
+    return position
+
+
+class CursorPage(Sequence):
+    """
+    A page of results from a `CursorPaginator`. Unlike Django's `Page` it has no page number,
+    only opaque cursors pointing at the neighbouring pages.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage next={self.next_cursor!r} previous={self.previous_cursor!r}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator over `queryset` ordered by `(field, pk)`, e.g. `("-published_date", "-id")`.
+
+    Each page is fetched with a WHERE clause on the last row seen instead of an OFFSET, and no
+    COUNT query is run, so the cost of a page doesn't depend on how deep it is.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+        self.descending = self.ordering[0].startswith("-")
+
+    def encode_cursor(self, obj):
+        value = getattr(obj, self.fields[0])
+        return encode_cursor([value.isoformat() if hasattr(value, "isoformat") else value, obj.pk])
+
+    def decode_cursor(self, cursor):
+        model_fields = self.queryset.model._meta
+        try:
+            value, pk = decode_cursor(cursor)
+            return (
+                model_fields.get_field(self.fields[0]).to_python(value),
+                model_fields.pk.to_python(pk),
+            )
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor("That cursor is not valid")
+
+    def _after(self, value, pk, forwards):
+        # rows that come after (value, pk) when reading in the given direction
+        field, pk_name = self.fields
+        lookup = "lt" if self.descending == forwards else "gt"
+        return Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"{pk_name}__{lookup}": pk})
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page following the `after` cursor, or preceding the `before` cursor.
+        With neither, returns the first page.
+        """
+        queryset = self.queryset
+        forwards = before is None
+        cursor = after if forwards else before
+        if cursor:
+            queryset = queryset.filter(self._after(*self.decode_cursor(cursor), forwards))
+        if forwards:
+            ordering = self.ordering
+        else:
+            ordering = tuple(
+                name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering
+            )
+
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forwards:
+            rows.reverse()
+
+        if forwards:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = True, has_more
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0]) if has_previous and rows else None,
+        )
+
+
+class CursorPaginationMixin:
+    """
+    ListView mixin that switches to keyset pagination with `?after=` / `?before=` cursors when
+    `settings.BLOG_CURSOR_PAGINATION` is on. Views set `cursor_ordering` to `(field, pk)`.
+    """
+
+    cursor_ordering = None
+
+    def paginate_queryset(self, queryset, page_size):
+        if not settings.BLOG_CURSOR_PAGINATION:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(
+                after=self.request.GET.get("after"), before=self.request.GET.get("before")
+            )
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["cursor_pagination"] = isinstance(context.get("paginator"), CursorPaginator)
+        return context
@@ -0,0 +1,92 @@
+"""
+Query budgets for tests: fail when a block of code runs more queries than allowed, listing
+the queries it ran grouped by their SQL fingerprint so an N+1 query stands out.
+
+    with QueryBudget(3):
+        client.get("/")
+
+    @query_budget(3)
+    def test_something(self):
+        ...
+"""
+
+import re
+from collections import Counter
+from functools import wraps
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Returns `sql` with its literal values and parameter lists replaced by placeholders, so
+    queries that differ only in their values compare equal.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryBudget:
+    """
+    Context manager that raises AssertionError if the block runs more than `max_queries`
+    queries on database `using`.
+    """
+
+    def __init__(self, max_queries, using="default"):
+        self.max_queries = max_queries
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.queries) > self.max_queries:
+            raise AssertionError(self.failure_message())
+
+    @property
+    def queries(self):
+        return [query["sql"] for query in self.context.captured_queries]
+
+    def fingerprints(self):
+        """
+        Returns a Counter of the fingerprints of the queries run in the block.
+        """
+        return Counter(fingerprint(sql) for sql in self.queries)
+
+    def failure_message(self):
+        lines = [
+            f"{len(self.queries)} queries executed on {self.using!r}, "
+            f"the budget is {self.max_queries}. By fingerprint:"
+        ]
+        for sql, count in self.fingerprints().most_common():
+            lines.append(f"{count:4d} x {sql}")
+        lines.append("Queries:")
+        lines.extend(f"{number:4d}. {sql}" for number, sql in enumerate(self.queries, start=1))
+        return "\n".join(lines)
+
+
+def query_budget(max_queries, using="default"):
+    """
+    Decorator that runs the function inside a `QueryBudget`.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(max_queries, using=using):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,107 @@
+"""
+Database routing for read replicas.
+
+Inside a request handled by `blog.middleware.ReplicaRoutingMiddleware`, reads go to one of
+`settings.BLOG_READ_REPLICAS` unless the request has been pinned to the primary: because it
+isn't a safe method, its view is decorated with `use_primary_db`, it has already written to
+the database, or the same browser wrote something within the last
+`settings.BLOG_REPLICA_LAG_SECONDS`. Outside a request every query goes to the primary.
+
+Sessions and users are always read from the primary, since the middleware that loads them
+runs before the request is pinned: a stale session or user would log someone out right after
+logging in, or keep permissions that were just taken away.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+PRIMARY_DB = "default"
+
+# apps whose models are only read from the primary
+PRIMARY_APPS = {"auth", "sessions"}
+
+_state = ContextVar("blog_replica_routing", default=None)
+
+
+class RoutingState:
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+        self.replica = None
+
+
+@contextmanager
+def replica_routing(primary=False):
+    """
+    Routes reads made inside the block to a read replica, unless `primary` is True.
+    Yields the `RoutingState`, whose `wrote` attribute says whether anything was written.
+    """
+    state = RoutingState(primary=primary)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def pin_to_primary():
+    state = _state.get()
+    if state is not None:
+        state.primary = True
+
+
+def use_primary_db(view):
+    """
+    View decorator that sends all of the view's queries to the primary database.
+    """
+
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            pin_to_primary()
+            return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        pin_to_primary()
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or state.primary
+            or not settings.BLOG_READ_REPLICAS
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return PRIMARY_DB
+        if state.replica is None:
+            # stay on one replica for the whole request so reads are consistent
+            state.replica = random.choice(settings.BLOG_READ_REPLICAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # later reads in this request must see the write
+            state.wrote = True
+            state.primary = True
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY_DB, *settings.BLOG_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,203 @@
+"""
+Full-text search over posts, backed by an SQLite FTS5 table.
+
+Each post is one row in `blog_post_search`, with `rowid` set to the post's id and its
+approved comments concatenated into the `comments` column. Rows are kept up to date by the
+signal handlers in `blog.signals` and can be rebuilt with `manage.py rebuild_search_index`.
+"""
+
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post, publish_cutoff
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+SEARCH_TABLE = "blog_post_search"
+
+# title matches count for more than body matches, which count for more than comment matches
+BM25_WEIGHTS = (10.0, 1.0, 0.5)
+
+# characters that can't appear in post text, used to mark matches in snippets before escaping
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+
+def search_available():
+    return connection.vendor == "sqlite"
+
+
+def _documents(posts):
+    """
+    Yields `(id, title, text, comments)` rows for `posts`, loading the approved comments for
+    all of them in one query.
+    """
+    comments = {}
+    approved = (
+        Comment.objects.filter(post__in=[post.pk for post in posts], approved_comment=True)
+        .order_by("post", "created_date", "id")
+        .values_list("post", "text")
+    )
+    for post_id, text in approved:
+        comments.setdefault(post_id, []).append(text)
+    for post in posts:
+        yield (post.pk, post.title, post.text, "\n".join(comments.get(post.pk, [])))
+
+
+def index_posts(post_ids):
+    """
+    Replaces the search rows for the given posts with their current title, text and approved
+    comments. Posts that no longer exist are removed from the index.
+    """
+    post_ids = list(post_ids)
+    if not search_available() or not post_ids:
+        return
+    posts = list(Post.objects.filter(pk__in=post_ids).only("pk", "title", "text"))
+    remove_posts(post_ids)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, text, comments) VALUES (%s, %s, %s, %s)",
+            list(_documents(posts)),
+        )
+
+
+def index_comment(post_id, text):
+    """
+    Adds a newly approved comment to its post's search row, without loading the post's other
+    comments.
+    """
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {SEARCH_TABLE} SET comments = CASE WHEN comments = '' THEN %s "
+            "ELSE comments || char(10) || %s END WHERE rowid = %s",
+            [text, text, post_id],
+        )
+        indexed = cursor.rowcount
+    if not indexed:
+        index_posts([post_id])
+
+
+def remove_posts(post_ids):
+    post_ids = list(post_ids)
+    if not search_available() or not post_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", post_ids)
+
+
+def rebuild_index(batch_size=500):
+    """
+    Rebuilds the whole index, reading posts in batches of `batch_size` so memory use doesn't
+    grow with the number of posts. Yields the number of posts indexed after each batch.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    indexed = 0
+    last_pk = 0
+    while True:
+        posts = list(
+            Post.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .only("pk", "title", "text")[:batch_size]
+        )
+        if not posts:
+            break
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, text, comments) "
+                "VALUES (%s, %s, %s, %s)",
+                list(_documents(posts)),
+            )
+        indexed += len(posts)
+        last_pk = posts[-1].pk
+        yield indexed
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def match_expression(query):
+    """
+    Turns free text typed by a user into an FTS5 query: every word must match, and the last
+    one may be a prefix so results show up while typing. Returns "" if there's nothing to search.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>"))
+
+
+class SearchResult:
+    def __init__(self, post, rank, snippet):
+        self.post = post
+        self.rank = rank
+        self.snippet = snippet
+
+
+def search(query, after=None, limit=10):
+    """
+    Returns `(results, next_cursor)` for published posts matching `query`, best match first
+    by bm25. Pass `next_cursor` back as `after` for the next page; it's None on the last page.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+
+    rank_sql = f"bm25({SEARCH_TABLE}, {', '.join(str(weight) for weight in BM25_WEIGHTS)})"
+    sql = (
+        f"SELECT s.post_id, s.score FROM ("
+        f"  SELECT rowid AS post_id, {rank_sql} AS score FROM {SEARCH_TABLE}"
+        f"  WHERE {SEARCH_TABLE} MATCH %s"
+        f") s INNER JOIN {Post._meta.db_table} p ON p.id = s.post_id "
+        "WHERE p.published_date <= %s"
+    )
+    # raw SQL gets no field conversion, so store the cutoff the way the column does
+    params = [expression, connection.ops.adapt_datetimefield_value(publish_cutoff())]
+    if after:
+        try:
+            rank, post_id = decode_cursor(after)
+            rank, post_id = float(rank), int(post_id)
+        except (ValueError, TypeError):
+            raise InvalidCursor("That cursor is not valid")
+        sql += " AND (s.score > %s OR (s.score = %s AND s.post_id > %s))"
+        params += [rank, rank, post_id]
+    sql += " ORDER BY s.score, s.post_id LIMIT %s"
+    params.append(limit + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ranked = cursor.fetchall()
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        next_cursor = encode_cursor([ranked[-1][1], ranked[-1][0]])
+    if not ranked:
+        return [], None
+
+    # snippets are only worked out for the rows on this page
+    ids = [post_id for post_id, rank in ranked]
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({SEARCH_TABLE}, -1, %s, %s, '…', 16) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [_MATCH_START, _MATCH_END, expression, *ids],
+        )
+        snippets = dict(cursor.fetchall())
+    posts = Post.objects.defer("text").in_bulk(ids)
+    results = [
+        SearchResult(posts[post_id], rank, _highlight(snippets.get(post_id, "")))
+        for post_id, rank in ranked
+        if post_id in posts
+    ]
+    return results, next_cursor
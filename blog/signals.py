@@ -0,0 +1,191 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import invalidate_post
+from .instrumentation import record_query
+from .models import Comment, Post
+from .search import index_comment, index_posts, remove_posts
+from .sqlite import apply_pragmas
+from .user_cache import forget_user
+
+
+# set while a bulk delete updates the posts of the comments it removes once for the batch, so
+# the per-comment post_delete handlers below have nothing to do
+_bulk_comment_delete = ContextVar("bulk_comment_delete", default=False)
+
+
+@contextmanager
+def bulk_comment_delete():
+    """
+    Skips the post_delete handlers of the comments deleted inside the block. The caller brings
+    the affected posts' counters, pages and search index up to date itself.
+    """
+    token = _bulk_comment_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_comment_delete.reset(token)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, settings.BLOG_SQLITE_PRAGMAS)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # the wrapper list outlives the connection, so only add it on the first connect
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _count_approved_comment(post_id, change):
+    posts = Post.objects.filter(pk=post_id)
+    if change < 0:
+        posts = posts.filter(approved_comment_count__gt=0)
+    posts.update(approved_comment_count=F("approved_comment_count") + change)
+
+
+def _counted_fields_saved(update_fields):
+    return update_fields is None or not update_fields.isdisjoint({"approved_comment", "post"})
+
+
+@receiver(pre_save, sender=Comment)
+def remember_counted_post(sender, instance, raw, update_fields, **kwargs):
+    """
+    Notes which post the comment was on, and which post's `approved_comment_count` included
+    it, before it's saved, however it's saved: by `approve()`, the admin, a form or a plain
+    `save()`.
+    """
+    instance._saved_post_id = None
+    instance._counted_post_id = None
+    if raw or instance._state.adding or not _counted_fields_saved(update_fields):
+        return
+    saved = Comment.objects.filter(pk=instance.pk).values_list("approved_comment", "post_id")
+    for approved, post_id in saved:
+        instance._saved_post_id = post_id
+        instance._counted_post_id = post_id if approved else None
+
+
+@receiver(post_save, sender=Comment)
+def update_approved_comment_count(sender, instance, raw, update_fields, **kwargs):
+    """
+    Keeps `Post.approved_comment_count` in step when a comment is created approved, or is
+    approved, unapproved or moved to another post.
+    """
+    if raw or not _counted_fields_saved(update_fields):
+        return
+    old_post_id = getattr(instance, "_counted_post_id", None)
+    new_post_id = instance.post_id if instance.approved_comment else None
+    if old_post_id == new_post_id:
+        return
+    if old_post_id is not None:
+        _count_approved_comment(old_post_id, -1)
+    if new_post_id is not None:
+        _count_approved_comment(new_post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_approved_comment_count(sender, instance, **kwargs):
+    """
+    Keeps `Post.approved_comment_count` in step when an approved comment is deleted.
+    """
+    if _bulk_comment_delete.get():
+        return
+    if instance.approved_comment:
+        _count_approved_comment(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def touch_post_modified_date(sender, instance, **kwargs):
+    """
+    Adding, approving, moving or removing a comment changes its post's detail page.
+    """
+    if _bulk_comment_delete.get():
+        return
+    post_ids = {instance.post_id, getattr(instance, "_saved_post_id", None)} - {None}
+    Post.objects.filter(pk__in=post_ids).update(modified_date=timezone.now())
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_saved_comment_pages(sender, instance, **kwargs):
+    """
+    Comments always show up on their post's detail page, but only approved ones change the
+    counts on the post list: saving a comment that is or was approved changes them. A comment
+    moved to another post also leaves the old post's detail page.
+    """
+    was_counted = getattr(instance, "_counted_post_id", None) is not None
+    invalidate_post(instance.post_id, post_list=instance.approved_comment or was_counted)
+    saved_post_id = getattr(instance, "_saved_post_id", None)
+    if saved_post_id is not None and saved_post_id != instance.post_id:
+        invalidate_post(saved_post_id, post_list=False)
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment_pages(sender, instance, **kwargs):
+    if _bulk_comment_delete.get():
+        return
+    invalidate_post(instance.post_id, post_list=instance.approved_comment)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, created, update_fields, **kwargs):
+    """
+    Only approved comments are searchable. One that's just been approved, by `approve()` or
+    on creation, is added to its post's row; any other edit may have changed an indexed
+    comment, so the row is rebuilt.
+    """
+    if instance.approved_comment and (created or update_fields == {"approved_comment"}):
+        index_comment(instance.post_id, instance.text)
+    elif not created:
+        index_posts([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    if _bulk_comment_delete.get():
+        return
+    if instance.approved_comment:
+        index_posts([instance.post_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    Saving a user may change their password or permissions, so the cached copy is dropped.
+    """
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
@@ -0,0 +1,42 @@
+"""
+Connection-time tuning for SQLite.
+
+`apply_pragmas()` is run on every new database connection by the `connection_created`
+handler in `blog.signals`, with the pragmas from `settings.BLOG_SQLITE_PRAGMAS`.
+"""
+
+# pragmas that can be applied, and the values they accept
+PRAGMAS = {
+    "journal_mode": {"delete", "truncate", "persist", "memory", "wal", "off"},
+    "synchronous": {"off", "normal", "full", "extra"},
+    "mmap_size": int,
+    "cache_size": int,
+    "busy_timeout": int,
+    "temp_store": {"default", "file", "memory"},
+    "foreign_keys": {"on", "off"},
+}
+
+
+def pragma_statements(pragmas):
+    """
+    Returns the PRAGMA statements for `pragmas`, a dict of pragma name to value, raising
+    ValueError for unknown pragmas or values (pragma values can't be query parameters).
+    """
+    statements = []
+    for name, value in pragmas.items():
+        allowed = PRAGMAS.get(name)
+        if allowed is None:
+            raise ValueError(f"Unsupported SQLite pragma: {name}")
+        if allowed is int:
+            value = int(value)
+        else:
+            value = str(value).lower()
+            if value not in allowed:
+                raise ValueError(f"Unsupported value for SQLite pragma {name}: {value}")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+def apply_pragmas(cursor, pragmas):
+    for statement in pragma_statements(pragmas):
+        cursor.execute(statement)
@@ -0,0 +1,121 @@
+"""
+WSGI middleware that serves the collected static files from `STATIC_ROOT` before a request
+reaches Django.
+
+Only files named in the `collectstatic` manifest are served; anything else, including every
+file when `collectstatic` hasn't been run, falls through to Django. Files requested under their
+hashed names never change, so they are sent with a far-future, immutable Cache-Control header.
+The unhashed names are cached briefly. When the browser accepts it, the brotli or gzip copy
+written by `blog.storage.CompressedManifestStaticFilesStorage` is sent instead of the file
+itself.
+"""
+
+import json
+import mimetypes
+from pathlib import Path
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.utils.http import http_date, parse_http_date_safe
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CACHE_CONTROL = "public, max-age=60"
+
+# preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(header):
+    """
+    Returns the content codings an Accept-Encoding header allows.
+    """
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = Path(root or settings.STATIC_ROOT).resolve()
+        self.prefix = "/" + (prefix or settings.STATIC_URL).lstrip("/")
+        self._manifest = None
+
+    def manifest(self):
+        """
+        Returns the unhashed and hashed names from the `collectstatic` manifest, read once.
+        """
+        if self._manifest is None:
+            try:
+                with open(self.root / "staticfiles.json") as f:
+                    paths = json.load(f)["paths"]
+                self._manifest = (set(paths), set(paths.values()))
+            except (OSError, ValueError, KeyError, TypeError):
+                self._manifest = (set(), set())
+        return self._manifest
+
+    def find(self, name):
+        """
+        Returns the path of the collected file `name`, or None if it isn't in the manifest.
+        """
+        names, hashed_names = self.manifest()
+        if name not in names and name not in hashed_names:
+            return None
+        path = (self.root / name).resolve()
+        if path.is_relative_to(self.root) and path.is_file():
+            return path
+        return None
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get("PATH_INFO", "")
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD") or not path_info.startswith(
+            self.prefix
+        ):
+            return self.application(environ, start_response)
+        name = path_info[len(self.prefix) :]
+        path = self.find(name)
+        if path is None:
+            return self.application(environ, start_response)
+
+        content_type, _ = mimetypes.guess_type(name)
+        content_type = content_type or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "image/svg+xml":
+            content_type += "; charset=utf-8"
+        stat = path.stat()
+        headers = [
+            ("Content-Type", content_type),
+            ("Last-Modified", http_date(stat.st_mtime)),
+            ("Vary", "Accept-Encoding"),
+            (
+                "Cache-Control",
+                IMMUTABLE_CACHE_CONTROL if name in self.manifest()[1] else CACHE_CONTROL,
+            ),
+        ]
+
+        if_modified_since = parse_http_date_safe(environ.get("HTTP_IF_MODIFIED_SINCE"))
+        if if_modified_since is not None and int(stat.st_mtime) <= if_modified_since:
+            start_response("304 Not Modified", headers)
+            return []
+
+        accepted = accepted_encodings(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        for coding, suffix in ENCODINGS:
+            compressed = path.with_name(path.name + suffix)
+            if coding in accepted and compressed.is_file():
+                path = compressed
+                headers.append(("Content-Encoding", coding))
+                break
+        headers.append(("Content-Length", str(path.stat().st_size)))
+        start_response("200 OK", headers)
+        if environ["REQUEST_METHOD"] == "HEAD":
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        return file_wrapper(open(path, "rb"))
@@ -0,0 +1,159 @@
+"""
+Exporting the pages anonymous readers see to HTML files, so a static file server can serve
+them instead of Django.
+
+Each page is written to `<output>/<URL path>/index.html`, with every query parameter adding
+two more path segments: `/?page=2` is written to `page/2/index.html` and
+`/3/?comments_page=2` to `3/comments_page/2/index.html`. The server maps the pagination links
+to those files, e.g. with nginx:
+
+    location = / { try_files /page/$arg_page/index.html /index.html @django; }
+
+`export_site()` keeps a manifest of what it wrote in the output directory. The next export
+only renders the detail pages of posts published or modified since the last one started
+(adding, approving or removing a comment modifies its post), and the list pages whose posts
+changed, and deletes the pages of posts that are no longer published.
+"""
+
+import datetime
+import json
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Q
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .models import Post
+from .views import PostListView
+
+MANIFEST_NAME = ".export.json"
+
+
+def page_file(output, path, params=()):
+    """
+    Returns the file the page at `path` with the query parameters `params`, a list of
+    (name, value) pairs, is written to.
+    """
+    parts = [part for part in path.split("/") if part]
+    for name, value in params:
+        parts += [name, str(value)]
+    return Path(output, *parts, "index.html")
+
+
+def render_page(path, params=()):
+    """
+    Returns the HTML of the page at `path` as an anonymous reader sees it.
+    """
+    request = RequestFactory().get(path, dict(params))
+    request.user = AnonymousUser()
+    match = resolve(path)
+    request.resolver_match = match
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    response = view(request, *match.args, **match.kwargs)
+    if hasattr(response, "render") and callable(response.render):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f"{path} returned status {response.status_code}")
+    return response.content
+
+
+def _write(file, content):
+    # write to a temporary file and rename it, so the server never sees a partial page
+    file.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=file.parent, prefix=".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, file)
+
+
+def _read_manifest(output):
+    try:
+        with open(Path(output, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_site(output, full=False):
+    """
+    Writes the post list and the detail page of every published post to `output`, only
+    rendering the pages that changed since the last export unless `full` is true.
+    Returns the numbers of pages written and removed.
+    """
+    output = Path(output)
+    manifest = None if full else _read_manifest(output)
+    started = timezone.now()
+    per_page = settings.BLOG_COMMENTS_PER_PAGE
+    posts = Post.published.order_by("-published_date").annotate(
+        num_approved_comments=Count("comments", filter=Q(comments__approved_comment=True))
+    )
+    comment_pages = {}
+    modified = {}
+    for pk, modified_date, num_approved_comments in posts.values_list(
+        "pk", "modified_date", "num_approved_comments"
+    ):
+        comment_pages[str(pk)] = max(1, math.ceil(num_approved_comments / per_page))
+        modified[str(pk)] = modified_date
+    ordered = list(comment_pages)
+    pages = [
+        ordered[start : start + PostListView.paginate_by]
+        for start in range(0, len(ordered), PostListView.paginate_by)
+    ] or [[]]
+
+    if manifest is None:
+        old_comment_pages, old_pages = {}, []
+        changed = set(ordered)
+    else:
+        old_comment_pages, old_pages = manifest["comment_pages"], manifest["pages"]
+        since = datetime.datetime.fromisoformat(manifest["started"])
+        changed = {pk for pk in ordered if pk not in old_comment_pages or modified[pk] >= since}
+    written = removed = 0
+
+    for pk in sorted(changed, key=int):
+        path = reverse("blog:detail", kwargs={"pk": pk})
+        for number in range(1, comment_pages[pk] + 1):
+            params = [("comments_page", number)] if number > 1 else []
+            _write(page_file(output, path, params), render_page(path, params))
+            written += 1
+        for number in range(comment_pages[pk] + 1, old_comment_pages.get(pk, 0) + 1):
+            page_file(output, path, [("comments_page", number)]).unlink(missing_ok=True)
+            removed += 1
+
+    for pk in old_comment_pages.keys() - comment_pages.keys():
+        path = reverse("blog:detail", kwargs={"pk": pk})
+        shutil.rmtree(page_file(output, path).parent, ignore_errors=True)
+        removed += old_comment_pages[pk]
+
+    path = reverse("blog:post_list")
+    for number, page in enumerate(pages, start=1):
+        # every list page shows the page count, so they all change when it does
+        if (
+            len(pages) != len(old_pages)
+            or page != old_pages[number - 1]
+            or changed.intersection(page)
+        ):
+            params = [("page", number)] if number > 1 else []
+            _write(page_file(output, path, params), render_page(path, params))
+            written += 1
+    for number in range(len(pages) + 1, len(old_pages) + 1):
+        page_file(output, path, [("page", number)]).unlink(missing_ok=True)
+        removed += 1
+
+    _write(
+        output / MANIFEST_NAME,
+        json.dumps(
+            {"started": started.isoformat(), "comment_pages": comment_pages, "pages": pages}
+        ).encode(),
+    )
+    return written, removed
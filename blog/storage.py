@@ -0,0 +1,79 @@
+"""
+Static files storage for `collectstatic`.
+
+Files are saved under names that include a hash of their contents (`blog.1a2b3c4d5e6f.css`),
+so they can be cached forever, and the `{% static %}` tag links to the hashed names. Text
+files also get gzip and, when the `brotli` package is installed, brotli compressed copies
+(`.gz` and `.br`), which `blog.static_handler` serves to browsers that accept them.
+"""
+
+import gzip
+from pathlib import PurePath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".txt", ".json", ".map", ".xml"}
+
+# smaller files aren't worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+def compressors():
+    """
+    Returns (suffix, compress function) pairs for the available compression formats.
+    """
+    formats = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        formats.append((".br", lambda data: brotli.compress(data, quality=11)))
+    return formats
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        """
+        Falls back to the unhashed name when `collectstatic` hasn't been run, so pages can
+        still be rendered in development and tests.
+        """
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.hashed_files:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            self.compress(name)
+
+    def compress(self, name):
+        """
+        Saves compressed copies of `name` next to it.
+        """
+        if PurePath(name).suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            # keep the copy only if it's meaningfully smaller
+            if len(compressed) < len(data) * 0.95:
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,37 @@
+"""
+Loading the blog's templates ahead of time.
+
+With the cached template loader each template is read and compiled the first time it's used.
+`warm_templates()` does that for every template in blog/templates when mysite/wsgi.py or
+mysite/asgi.py loads the application, if `settings.BLOG_WARM_TEMPLATES` is on, so the first
+requests after a deploy don't pay for it.
+"""
+
+from pathlib import Path
+
+from django.template import engines
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+def template_names():
+    """
+    Returns the names of the templates in blog/templates, such as "blog/base.html".
+    """
+    return sorted(
+        path.relative_to(TEMPLATE_DIR).as_posix()
+        for path in TEMPLATE_DIR.rglob("*.html")
+        if path.is_file()
+    )
+
+
+def warm_templates():
+    """
+    Loads every template in blog/templates into each template engine's cache. Returns the
+    names of the templates loaded.
+    """
+    names = template_names()
+    for engine in engines.all():
+        for name in names:
+            engine.get_template(name)
+    return names
@@ -0,0 +1,41 @@
+"""
+Tags for linking to the vendored third-party stylesheets listed in `blog.vendor`.
+"""
+
+import functools
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html
+
+from blog.vendor import VENDORED_STYLESHEETS
+
+register = template.Library()
+
+
+@functools.cache
+def is_vendored(path):
+    """
+    Returns whether `manage.py vendor_static` has downloaded the stylesheet at `path`. Looked
+    up once per process.
+    """
+    return finders.find(path) is not None or staticfiles_storage.exists(path)
+
+
+@register.simple_tag
+def vendored_stylesheet(path):
+    """
+    Outputs a link to the vendored stylesheet `path`, or to its pinned upstream URL when it
+    hasn't been vendored.
+    """
+    if is_vendored(path):
+        return format_html('<link rel="stylesheet" href="{}">', staticfiles_storage.url(path))
+    url, integrity = VENDORED_STYLESHEETS[path]
+    if integrity:
+        return format_html(
+            '<link rel="stylesheet" href="{}" integrity="{}" crossorigin="anonymous">',
+            url,
+            integrity,
+        )
+    return format_html('<link rel="stylesheet" href="{}">', url)
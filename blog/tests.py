@@ -1,11 +1,74 @@
 import datetime
-
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
+from wsgiref.util import setup_testing_defaults
+from xml.etree import ElementTree
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+from django.core.asgi import get_asgi_application
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+from django.template import Context, Template, defaultfilters, engines
+from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
 from django.utils import timezone
 
-from .models import Comment, Post
+import mysite.urls
+from mysite.env import env_flag
+
+from .benchmark import percentile, read_trace, seed_database, synthetic_trace, write_trace
+from .cache import page_cache
+from .comment_queue import DEAD_LETTER_NAME, SPOOL_NAME, process_queue
+from .feeds import XMLFeed
+from .fragments import render_fragments
+from .instrumentation import Histogram, metrics_text, reset_metrics
+from .management.commands.benchmark import Command as BenchmarkCommand
+from .management.commands.benchmark_asgi import Command as BenchmarkASGICommand
+from .middleware import PRIMARY_COOKIE
+from .models import EXCERPT_CHARS, EXCERPT_WORDS, Comment, Post, make_excerpt, publish_cutoff
+from .moderation import approve_comments
+from .query_budget import QueryBudget, fingerprint, query_budget
+from .routers import replica_routing
+from .search import search, search_available
+from .sqlite import pragma_statements
+from .static_handler import IMMUTABLE_CACHE_CONTROL, StaticFilesMiddleware
+from .template_cache import template_names, warm_templates
+from .templatetags.blog_static import is_vendored
+from .urls import async_urlpatterns
+from .user_cache import user_cache
+from .vendor import VENDORED_STYLESHEETS, integrity, vendor_stylesheet
+from .views import DraftPostListView, PostListView
+
+
+class TestCase(DjangoTestCase):
+    """
+    Clears the page and user caches before each test so cached responses and users don't
+    leak between tests.
+    """
+
+    def setUp(self):
+        super().setUp()
+        page_cache().clear()
+        user_cache().clear()
+
+    def assertQueryBudget(self, max_queries, using="default"):
+        """
+        Fails if the block runs more than `max_queries` queries, listing the queries it ran.
+        """
+        return QueryBudget(max_queries, using=using)
 
 
 # Test Models ---------------------------------------------------------------------------
@@ -28,11 +91,39 @@ def create_comment(author="me", text="a comment"):
     return Comment.objects.create(post=post, author=author, text=text)
 
 
+def create_busy_posts(author, count, comments, published=True):
+    """
+    Creates `count` posts by `author`, published an hour ago unless `published` is False,
+    with `comments` approved comments each.
+    """
+    posts = []
+    for i in range(count):
+        post = Post.objects.create(author=author, title=f"Busy post {i}", text="busy post text")
+        if published:
+            post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+        posts.append(post)
+    Comment.objects.bulk_create(
+        Comment(post=post, author="me", text=f"comment {i}", approved_comment=True)
+        for post in posts
+        for i in range(comments)
+    )
+    return posts
+
+
 class PostModelTests(TestCase):
     """
     Test that publishing a post sets its `published_date` field to today's date.
     """
 
+    def test_publish_post_defaults_to_now(self):
+        blog_post = create_post()
+        before = timezone.now()
+        blog_post.publish()
+        # dated at the current publish cutoff, so it's published straight away
+        self.assertGreaterEqual(blog_post.published_date, publish_cutoff(before))
+        self.assertLessEqual(blog_post.published_date, timezone.now())
+        self.assertIn(blog_post, Post.published.all())
+
     def test_publish_post(self):
         blog_post = create_post()
         self.assertIsNone(blog_post.published_date)
@@ -50,6 +141,95 @@ class PostModelTests(TestCase):
         self.assertEqual(blog_post.get_absolute_url(), "/1/")
 
 
+class PostExcerptTests(TestCase):
+    def test_excerpt_set_on_save(self):
+        text = " ".join(f"word{i}" for i in range(100))
+        blog_post = create_post(text=text)
+        self.assertLess(len(blog_post.excerpt), len(text))
+        self.assertTrue(text.startswith(blog_post.excerpt))
+        blog_post.text = "new text"
+        blog_post.save(update_fields=["text"])
+        blog_post.refresh_from_db()
+        self.assertEqual(blog_post.excerpt, "new text")
+
+    def test_excerpt_truncates_like_text(self):
+        for text in (
+            "short text",
+            " ".join(["word"] * 100),
+            " ".join(["a" * 30] * 20),
+            "x" * 1000,
+            "line one\n\nline two " * 50,
+        ):
+            self.assertEqual(
+                defaultfilters.truncatewords(make_excerpt(text), EXCERPT_WORDS),
+                defaultfilters.truncatewords(text, EXCERPT_WORDS),
+            )
+            self.assertEqual(
+                defaultfilters.truncatechars(make_excerpt(text), EXCERPT_CHARS),
+                defaultfilters.truncatechars(text, EXCERPT_CHARS),
+            )
+
+    def test_backfill_migration(self):
+        migration = importlib.import_module("blog.migrations.0006_post_excerpt")
+        state = MigrationLoader(connection).project_state(("blog", "0006_post_excerpt"))
+        blog_post = create_post(text="here is some text")
+        Post.objects.update(excerpt="")
+        migration.backfill_excerpt(state.apps, None)
+        blog_post.refresh_from_db()
+        self.assertEqual(blog_post.excerpt, "here is some text")
+
+
+@override_settings(BLOG_PUBLISH_GRANULARITY=60)
+class PublishedPostManagerTests(TestCase):
+    def test_published_is_evaluated_per_query(self):
+        post = create_post()
+        post.publish(date=timezone.now() + datetime.timedelta(hours=1))
+        self.assertQuerySetEqual(Post.published.all(), [])
+        later = timezone.now() + datetime.timedelta(hours=2)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertQuerySetEqual(Post.published.all(), [post])
+
+    def test_publish_cutoff_rounds_down(self):
+        now = datetime.datetime(2024, 3, 15, 12, 0, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(publish_cutoff(now), now.replace(second=0))
+        self.assertEqual(publish_cutoff(now.replace(second=0)), now.replace(second=0))
+
+    def test_scheduled_post_is_never_early(self):
+        post = create_post()
+        post.publish(date=timezone.now() + datetime.timedelta(seconds=30))
+        self.assertQuerySetEqual(Post.published.all(), [])
+        url = reverse("blog:detail", kwargs={"pk": post.pk})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        # logged-in users still see it
+        self.client.force_login(post.author)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_next_scheduled_publish(self):
+        self.assertIsNone(Post.objects.next_scheduled_publish())
+        post = create_post()
+        publish_date = (timezone.now() + datetime.timedelta(hours=1)).replace(
+            second=30, microsecond=0
+        )
+        post.publish(date=publish_date)
+        # the post shows up at the start of the minute after it's scheduled
+        self.assertEqual(
+            Post.objects.next_scheduled_publish(),
+            publish_date.replace(second=0) + datetime.timedelta(minutes=1),
+        )
+
+    def test_scheduled_post_appears_in_list(self):
+        post = create_post()
+        post.publish(date=timezone.now() + datetime.timedelta(hours=1))
+        self.assertNotContains(self.client.get(reverse("blog:post_list")), post.title)
+        # the cached page expires when the post goes live
+        view = PostListView()
+        self.assertLessEqual(view.get_page_cache_timeout(), 60 * 60)
+        page_cache().clear()
+        later = timezone.now() + datetime.timedelta(hours=2)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertContains(self.client.get(reverse("blog:post_list")), post.title)
+
+
 class CommentModelTests(TestCase):
     def test_str(self):
         text = "This is the comment text"
@@ -62,6 +242,162 @@ class CommentModelTests(TestCase):
         comment.approve()
         self.assertTrue(comment.approved_comment)
 
+    def test_approve_updates_comment_count(self):
+        comment = create_comment()
+        comment.approve()
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.approved_comment_count, 1)
+        # approving twice doesn't count the comment twice
+        comment.approve()
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.approved_comment_count, 1)
+
+    def test_delete_updates_comment_count(self):
+        comment = create_comment()
+        Comment.objects.create(post=comment.post, author="me", text="unapproved")
+        comment.approve()
+        comment.delete()
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.approved_comment_count, 0)
+
+    def test_post_save_does_not_overwrite_comment_count(self):
+        comment = create_comment()
+        stale_post = Post.objects.get(pk=comment.post_id)
+        comment.approve()
+        stale_post.title = "A new title"
+        stale_post.save()
+        stale_post.refresh_from_db()
+        self.assertEqual(stale_post.approved_comment_count, 1)
+
+    def test_saving_approval_updates_comment_count(self):
+        post = create_post()
+        comment = Comment.objects.create(post=post, author="me", text="hi", approved_comment=True)
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 1)
+        # edited without touching the approval
+        comment.text = "edited"
+        comment.save()
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 1)
+        comment.approved_comment = False
+        comment.save()
+        post.refresh_from_db()
+        self.assertEqual(post.approved_comment_count, 0)
+
+    def test_moving_approved_comment_updates_both_counts(self):
+        comment = create_comment()
+        comment.approve()
+        other_post = Post.objects.create(author=comment.post.author, title="Other", text="x")
+        first_post = comment.post
+        comment.post = other_post
+        comment.save()
+        first_post.refresh_from_db()
+        other_post.refresh_from_db()
+        self.assertEqual(first_post.approved_comment_count, 0)
+        self.assertEqual(other_post.approved_comment_count, 1)
+
+    def test_post_force_insert(self):
+        post = create_post()
+        post.pk = None
+        post.save(force_insert=True)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_rebuild_comment_counts_command(self):
+        comment = create_comment()
+        Comment.objects.filter(pk=comment.pk).update(approved_comment=True)
+        call_command("rebuild_comment_counts", stdout=io.StringIO())
+        comment.post.refresh_from_db()
+        self.assertEqual(comment.post.approved_comment_count, 1)
+
+
+# Test Query Plans ----------------------------------------------------------------------
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(TestCase):
+    """
+    Test that the querysets behind the views are answered from an index, not a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = create_post()
+
+    def assertNoFullScan(self, queryset):
+        sql, params = queryset.query.get_compiler(connection=connection).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = [row[3] for row in cursor.fetchall()]
+        full_scans = [step for step in plan if step.startswith("SCAN ")]
+        self.assertEqual(full_scans, [], f"full scan in query plan for: {sql}")
+
+    def test_post_list_queryset(self):
+        view = PostListView()
+        self.assertNoFullScan(view.get_queryset()[:2])
+
+    def test_draft_list_queryset(self):
+        self.assertNoFullScan(DraftPostListView.queryset[:2])
+
+    def test_approved_comments_queryset(self):
+        self.assertNoFullScan(self.post.approved_comments())
+
+    def test_post_comments_queryset(self):
+        self.assertNoFullScan(self.post.comments.all())
+
+
+class QueryBudgetTests(TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT *  FROM blog_post WHERE id IN (1, 2, 3) AND title = 'it''s'"),
+            "SELECT * FROM blog_post WHERE id IN (...) AND title = ?",
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM "blog_post" WHERE "id" = 1'),
+            fingerprint('SELECT * FROM "blog_post" WHERE "id" = 22'),
+        )
+
+    def test_over_budget_lists_queries(self):
+        posts = create_busy_posts(User.objects.create_user(username="test"), 3, 0)
+        with self.assertRaises(AssertionError) as cm:
+            with self.assertQueryBudget(1):
+                for post in posts:
+                    list(post.comments.all())
+        message = str(cm.exception)
+        self.assertIn("3 queries executed on 'default', the budget is 1", message)
+        self.assertIn('   3 x SELECT "blog_comment"', message)
+        self.assertIn(f'"blog_comment"."post_id" = {posts[2].pk}', message)
+
+    def test_decorator(self):
+        @query_budget(1)
+        def two_queries():
+            Post.objects.count()
+            Post.objects.count()
+
+        with self.assertRaises(AssertionError):
+            two_queries()
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite specific tuning")
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_to_connection(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_invalid_pragmas_rejected(self):
+        with self.assertRaises(ValueError):
+            pragma_statements({"journal_mode": "wal; DROP TABLE blog_post"})
+        with self.assertRaises(ValueError):
+            pragma_statements({"not_a_pragma": 1})
+        self.assertEqual(pragma_statements({"cache_size": "-2000"}), ["PRAGMA cache_size = -2000"])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_sqlite", seconds=0.1, readers=1, writers=1, posts=5, stdout=out)
+        self.assertIn("tuned", out.getvalue())
+
 
 # Test Views ---------------------------------------------------------------------------
 
@@ -169,6 +505,124 @@ class PostListViewTests(TestCase):
         self.assertContains(response, "Comments: 0")
         # is there a better way to do this that associates comments with the specific post?
 
+    def test_comment_counts_use_a_single_query(self):
+        """
+        Test that the number of queries doesn't grow with the number of posts on the page.
+        """
+        for post in (self.post2, self.post3):
+            Comment.objects.create(post=post, author="me", text="a comment").approve()
+        # the ETag's aggregate over the published posts, a COUNT query for the paginator, the
+        # annotated posts and the next scheduled post for the page cache timeout
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("blog:post_list"))
+        self.assertEqual(
+            [post.num_approved_comments for post in response.context["post_list"]], [1, 1]
+        )
+
+    def test_list_does_not_load_post_text(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("blog:post_list"))
+        self.assertContains(response, "post text goes here")
+        for query in queries:
+            self.assertNotIn('"blog_post"."text"', query["sql"])
+
+    def test_query_budget(self):
+        """
+        Test that the number of queries stays the same as the page and its comments grow.
+        """
+        user = self.post1.author
+        for per_page, comments in ((2, 0), (10, 5)):
+            create_busy_posts(user, per_page, comments)
+            with mock.patch.object(PostListView, "paginate_by", per_page):
+                self.client.logout()
+                page_cache().clear()
+                # the ETag's aggregate, the paginator COUNT, the posts and the next scheduled
+                # post for the page cache timeout
+                with self.assertQueryBudget(4):
+                    response = self.client.get(reverse("blog:post_list"))
+                self.assertEqual(len(response.context["post_list"]), per_page)
+                # the user replaces the page cache timeout lookup; the session is in the cache
+                self.client.force_login(user)
+                with self.assertQueryBudget(4):
+                    self.client.get(reverse("blog:post_list"))
+
+    def test_draft_list_query_budget(self):
+        user = self.post1.author
+        self.client.force_login(user)
+        for per_page in (2, 10):
+            create_busy_posts(user, per_page, 0, published=False)
+            with mock.patch.object(DraftPostListView, "paginate_by", per_page):
+                # the user, the paginator COUNT and the drafts
+                with self.assertQueryBudget(3):
+                    response = self.client.get(reverse("blog:post_draft_list"))
+            self.assertEqual(len(response.context["post_list"]), per_page)
+
+    @override_settings(BLOG_USE_COMMENT_COUNT_COLUMN=True)
+    def test_comment_counts_from_column(self):
+        Comment.objects.create(post=self.post3, author="me", text="a comment").approve()
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertContains(response, "Comments: 1")
+        self.assertContains(response, "Comments: 0")
+
+
+@override_settings(BLOG_CURSOR_PAGINATION=True)
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="test", password="secret")
+        now = timezone.now()
+        # two posts share a published date so the id tie-breaker is exercised
+        cls.posts = []
+        for i, hours in enumerate([1, 2, 2, 3, 4]):
+            post = Post.objects.create(author=user, title=f"Post {i}", text="post text goes here")
+            post.publish(date=now - datetime.timedelta(hours=hours))
+            cls.posts.append(post)
+        cls.drafts = [
+            Post.objects.create(author=user, title=f"Draft {i}", text="draft text")
+            for i in range(3)
+        ]
+
+    def test_walk_forwards_and_back(self):
+        expected = [self.posts[0], self.posts[2], self.posts[1], self.posts[3], self.posts[4]]
+        response = self.client.get(reverse("blog:post_list"))
+        first_page = response.context["page_obj"]
+        self.assertQuerySetEqual(response.context["post_list"], expected[:2])
+        self.assertFalse(first_page.has_previous())
+
+        response = self.client.get(reverse("blog:post_list"), {"after": first_page.next_cursor})
+        second_page = response.context["page_obj"]
+        self.assertQuerySetEqual(response.context["post_list"], expected[2:4])
+
+        response = self.client.get(reverse("blog:post_list"), {"after": second_page.next_cursor})
+        self.assertQuerySetEqual(response.context["post_list"], expected[4:])
+        self.assertFalse(response.context["page_obj"].has_next())
+
+        response = self.client.get(
+            reverse("blog:post_list"), {"before": second_page.previous_cursor}
+        )
+        self.assertQuerySetEqual(response.context["post_list"], expected[:2])
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_no_count_query(self):
+        # the ETag's aggregate, the page of posts and the next scheduled post for the page
+        # cache timeout, but no COUNT(*) for the number of pages
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("blog:post_list"))
+        self.assertNotContains(response, "Page ")
+        self.assertContains(response, "?after=")
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("blog:post_list"), {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_draft_list(self):
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        response = self.client.get(reverse("blog:post_draft_list"))
+        self.assertQuerySetEqual(response.context["post_list"], self.drafts[:2])
+        next_cursor = response.context["page_obj"].next_cursor
+        response = self.client.get(reverse("blog:post_draft_list"), {"after": next_cursor})
+        self.assertQuerySetEqual(response.context["post_list"], self.drafts[2:])
+
 
 class PostDetailViewTests(TestCase):
     @classmethod
@@ -205,6 +659,26 @@ class PostDetailViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["post"], self.unpublished_post)
 
+    def test_query_budget(self):
+        """
+        Test that the number of queries stays the same as the number of comments grows.
+        """
+        url = reverse("blog:detail", kwargs={"pk": self.published_post.pk})
+        for count in (1, 40):
+            Comment.objects.bulk_create(
+                Comment(post=self.published_post, author="me", text="hi", approved_comment=True)
+                for _ in range(count)
+            )
+            self.client.logout()
+            page_cache().clear()
+            # the Last-Modified/ETag lookup, the post and its comments
+            with self.assertQueryBudget(3):
+                self.client.get(url)
+            # plus the user
+            self.client.force_login(self.published_post.author)
+            with self.assertQueryBudget(4):
+                self.client.get(url)
+
 
 class CommentViewTests(TestCase):
     @classmethod
@@ -255,6 +729,62 @@ class CommentViewTests(TestCase):
         response = self.client.get(reverse("blog:detail", kwargs={"pk": 1}))
         self.assertContains(response, comment_text)
 
+    def test_query_budget(self):
+        url = reverse("blog:add_comment_to_post", kwargs={"pk": self.post.pk})
+        with self.assertQueryBudget(1):
+            self.client.get(url)
+        # the post, the insert and the post's modified date
+        with self.assertQueryBudget(3):
+            self.client.post(url, {"author": "me", "text": "a comment"})
+
+
+class CommentLoadingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=user, title="A post", text="post text goes here")
+        cls.post.publish()
+        cls.comments = []
+        for i in range(5):
+            comment = Comment.objects.create(post=cls.post, author="me", text=f"comment {i}")
+            if i % 2 == 0:
+                comment.approve()
+            cls.comments.append(comment)
+
+    def test_anonymous_user_only_loads_approved_comments(self):
+        response = self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        self.assertEqual(
+            list(response.context["comments"]),
+            [self.comments[0], self.comments[2], self.comments[4]],
+        )
+        self.assertIsNone(response.context["comments_page"])
+
+    def test_logged_in_user_loads_all_comments(self):
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        response = self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        self.assertEqual(list(response.context["comments"]), self.comments)
+
+    def test_comments_loaded_in_one_query(self):
+        # the Last-Modified/ETag lookup, the post and its comments
+        with self.assertNumQueries(3):
+            self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+
+    @override_settings(BLOG_COMMENTS_PER_PAGE=2)
+    def test_comments_paginated_above_threshold(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        response = self.client.get(url)
+        self.assertEqual(list(response.context["comments"]), [self.comments[0], self.comments[2]])
+        self.assertEqual(response.context["comments_page"].paginator.num_pages, 2)
+        self.assertContains(response, "?comments_page=2")
+        response = self.client.get(url, {"comments_page": 2})
+        self.assertEqual(list(response.context["comments"]), [self.comments[4]])
+
+    @override_settings(BLOG_COMMENTS_PER_PAGE=2)
+    def test_first_comments_page_reuses_the_first_fetch(self):
+        # the Last-Modified/ETag lookup, the post, its first comments and their COUNT
+        with self.assertNumQueries(4):
+            self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+
 
 class CommentApproveTests(TestCase):
     @classmethod
@@ -298,6 +828,1534 @@ class CommentApproveTests(TestCase):
         self.assertContains(response, "No comments here yet :(")
 
 
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=user, title="A post", text="post text goes here")
+        cls.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+
+    def test_anonymous_pages_are_cached(self):
+        for url in (reverse("blog:post_list"), reverse("blog:detail", kwargs={"pk": self.post.pk})):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.content, second.content)
+
+    def test_logged_in_users_get_fresh_pages(self):
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertTemplateUsed(response, "blog/detail.html")
+
+    def test_post_edit_invalidates_cache(self):
+        self.client.get(reverse("blog:post_list"))
+        self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        self.post.title = "An edited title"
+        self.post.save()
+        self.assertContains(self.client.get(reverse("blog:post_list")), "An edited title")
+        self.assertContains(
+            self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk})), "An edited title"
+        )
+
+    def test_publish_invalidates_post_list(self):
+        self.client.get(reverse("blog:post_list"))
+        new_post = Post.objects.create(author=self.post.author, title="New post", text="text")
+        self.assertNotContains(self.client.get(reverse("blog:post_list")), "New post")
+        new_post.publish(date=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertContains(self.client.get(reverse("blog:post_list")), "New post")
+
+    def test_comment_approval_invalidates_cache(self):
+        comment = Comment.objects.create(post=self.post, author="me", text="a comment")
+        self.assertNotContains(
+            self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk})), "a comment"
+        )
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 0")
+        comment.approve()
+        self.assertContains(
+            self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk})), "a comment"
+        )
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 1")
+        comment.delete()
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 0")
+
+    def test_comment_unapproval_invalidates_post_list(self):
+        Comment.objects.create(post=self.post, author="me", text="a comment", approved_comment=True)
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 1")
+        # as the admin saves it
+        comment = Comment.objects.get()
+        comment.approved_comment = False
+        comment.save()
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 0")
+
+    def test_moving_comment_invalidates_old_post(self):
+        comment = Comment.objects.create(
+            post=self.post, author="me", text="a comment", approved_comment=True
+        )
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        self.assertContains(self.client.get(url), "a comment")
+        comment.post = Post.objects.create(author=self.post.author, title="Other", text="x")
+        comment.save()
+        self.assertNotContains(self.client.get(url), "a comment")
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=user, title="A post", text="post text goes here")
+        cls.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+
+    def assertNotModified(self, url, response):
+        validators = [{"HTTP_IF_NONE_MATCH": response["ETag"]}]
+        if response.has_header("Last-Modified"):
+            validators.append({"HTTP_IF_MODIFIED_SINCE": response["Last-Modified"]})
+        for headers in validators:
+            page_cache().clear()
+            with self.assertTemplateNotUsed("blog/base.html"):
+                self.assertEqual(self.client.get(url, **headers).status_code, 304)
+
+    def test_unchanged_pages_not_modified(self):
+        for url in (reverse("blog:post_list"), reverse("blog:detail", kwargs={"pk": self.post.pk})):
+            response = self.client.get(url)
+            self.assertNotModified(url, response)
+
+    def test_not_modified_from_page_cache(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_comment_changes_modify_post(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        etag = self.client.get(url)["ETag"]
+        comment = Comment.objects.create(post=self.post, author="me", text="a comment")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        comment.approve()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "a comment")
+        etag = response["ETag"]
+        comment.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_edit_modifies_post(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        etag = self.client.get(url)["ETag"]
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        self.client.post(
+            reverse("blog:post_edit", kwargs={"pk": self.post.pk}),
+            {"title": "An edited title", "text": "Some text"},
+        )
+        self.client.logout()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "An edited title")
+
+    def test_etag_differs_for_logged_in_user(self):
+        url = reverse("blog:post_list")
+        etag = self.client.get(url)["ETag"]
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Hello test")
+
+    def test_new_post_modifies_post_list(self):
+        url = reverse("blog:post_list")
+        etag = self.client.get(url)["ETag"]
+        new_post = Post.objects.create(author=self.post.author, title="New post", text="text")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        new_post.publish(date=timezone.now() - datetime.timedelta(minutes=1))
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), "New post")
+
+    def test_deleted_post_modifies_post_list(self):
+        url = reverse("blog:post_list")
+        newer = Post.objects.create(author=self.post.author, title="Newer post", text="text")
+        newer.publish(date=timezone.now() - datetime.timedelta(minutes=1))
+        response = self.client.get(url)
+        # nothing left behind dates a deletion, so the list has no Last-Modified
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.post.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertNotContains(response, "A post")
+
+
+class AnonymousFastPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=cls.user, title="A post", text="post text goes here")
+        cls.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+
+    def public_urls(self):
+        return (
+            reverse("blog:post_list"),
+            reverse("blog:detail", kwargs={"pk": self.post.pk}),
+            reverse("blog:search") + "?q=post",
+        )
+
+    def test_anonymous_pages_are_publicly_cacheable(self):
+        for url in self.public_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, "A post")
+                self.assertContains(response, reverse("login"))
+                self.assertIn("public", response["Cache-Control"])
+                self.assertIn("max-age=60", response["Cache-Control"])
+                self.assertNotIn("Cookie", response.get("Vary", ""))
+                self.assertEqual(response["X-Frame-Options"], "DENY")
+                self.assertFalse(response.cookies)
+
+    def test_anonymous_pages_skip_the_session(self):
+        with mock.patch("blog.user_cache.get_user") as get_user, mock.patch(
+            "django.contrib.sessions.backends.base.SessionBase._get_session"
+        ) as get_session:
+            for url in self.public_urls():
+                self.client.get(url)
+        get_user.assert_not_called()
+        get_session.assert_not_called()
+
+    def test_other_middleware_still_runs(self):
+        with mock.patch(
+            "django.middleware.common.CommonMiddleware.process_response",
+            side_effect=lambda request, response: response,
+        ) as process_response:
+            for url in self.public_urls():
+                self.client.get(url)
+        self.assertEqual(process_response.call_count, len(self.public_urls()))
+
+    def test_logged_in_users_get_the_full_page(self):
+        self.client.force_login(self.user)
+        for url in self.public_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, "Hello test")
+                self.assertContains(response, reverse("logout"))
+                self.assertIn("Cookie", response["Vary"])
+                self.assertNotIn("public", response.get("Cache-Control", ""))
+
+    def test_session_cookie_takes_the_full_path(self):
+        # an anonymous session, e.g. a visitor part way through logging in
+        session = self.client.session
+        session["seen"] = True
+        session.save()
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertIn("Cookie", response["Vary"])
+        self.assertNotIn("public", response.get("Cache-Control", ""))
+
+    def test_other_pages_are_unaffected(self):
+        response = self.client.get(reverse("blog:post_draft_list"))
+        self.assertRedirects(
+            response, reverse("login") + "?next=" + reverse("blog:post_draft_list")
+        )
+        response = self.client.get(reverse("login"))
+        self.assertContains(response, "csrfmiddlewaretoken")
+        self.assertIn("csrftoken", response.cookies)
+
+    def test_draft_is_not_found(self):
+        draft = Post.objects.create(author=self.user, title="A draft", text="draft text")
+        response = self.client.get(reverse("blog:detail", kwargs={"pk": draft.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("public", response.get("Cache-Control", ""))
+
+    def test_conditional_get(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("public", response["Cache-Control"])
+
+    @override_settings(BLOG_ANONYMOUS_FAST_PATH=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertIn("Cookie", response["Vary"])
+        self.assertNotIn("public", response.get("Cache-Control", ""))
+
+
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+
+    def tables_queried(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("blog:post_draft_list"))
+        return response, " ".join(query["sql"] for query in queries.captured_queries)
+
+    def test_session_and_user_come_from_the_cache(self):
+        self.assertTrue(self.client.login(username="test", password="secret"))
+        response, sql = self.tables_queried()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("django_session", sql)
+        self.assertIn("auth_user", sql)
+        response, sql = self.tables_queried()
+        self.assertEqual(response.context["user"], self.user)
+        self.assertNotIn("django_session", sql)
+        self.assertNotIn("auth_user", sql)
+
+    @override_settings(BLOG_USER_CACHE_TIMEOUT=0)
+    def test_user_cache_disabled(self):
+        self.client.force_login(self.user)
+        self.tables_queried()
+        _, sql = self.tables_queried()
+        self.assertIn("auth_user", sql)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.client.force_login(self.user)
+        self.tables_queried()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.tables_queried()
+        self.assertEqual(response.status_code, 302)
+
+    def test_permission_change_is_seen(self):
+        self.client.force_login(self.user)
+        response, _ = self.tables_queried()
+        self.assertFalse(response.context["user"].is_staff)
+        self.user.is_staff = True
+        self.user.save()
+        response, _ = self.tables_queried()
+        self.assertTrue(response.context["user"].is_staff)
+
+    def test_requests_get_their_own_user(self):
+        self.client.force_login(self.user)
+        first, _ = self.tables_queried()
+        second, _ = self.tables_queried()
+        self.assertIsNot(first.context["user"]._wrapped, second.context["user"]._wrapped)
+        self.assertIsNot(first.context["user"]._state, second.context["user"]._state)
+
+    def test_logout(self):
+        self.client.force_login(self.user)
+        self.tables_queried()
+        self.client.post(reverse("logout"))
+        response, _ = self.tables_queried()
+        self.assertRedirects(
+            response, reverse("login") + "?next=" + reverse("blog:post_draft_list")
+        )
+
+    def test_password_change_logs_out_other_sessions(self):
+        other_browser = self.client_class()
+        other_browser.force_login(self.user)
+        self.client.force_login(self.user)
+        self.tables_queried()
+
+        self.user.set_password("a new password")
+        self.user.save()
+        response = other_browser.get(reverse("blog:post_draft_list"))
+        self.assertEqual(response.status_code, 302)
+        response, _ = self.tables_queried()
+        self.assertEqual(response.status_code, 302)
+
+    def test_stale_cached_user_is_checked_against_the_session(self):
+        # the password changed without saving the user, so the cached user is stale
+        self.client.force_login(self.user)
+        self.tables_queried()
+        User.objects.filter(pk=self.user.pk).update(password="changed elsewhere")
+        other_browser = self.client_class()
+        other_browser.force_login(User.objects.get(pk=self.user.pk))
+        response = other_browser.get(reverse("blog:post_draft_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"].password, "changed elsewhere")
+
+
+class FragmentCacheTests(TestCase):
+    text = (
+        "First <b>paragraph</b> with a few words in it.\nSecond line.\n\nSecond paragraph & more."
+    )
+
+    def test_same_output_as_builtin_filters(self):
+        for name, arg in (
+            ("linebreaks", None),
+            ("linebreaksbr", None),
+            ("truncatewords", 3),
+            ("truncatechars", 20),
+        ):
+            builtin = f"{name}:{arg}" if arg else name
+            self.assertEqual(
+                render_fragments([(name, self.text, arg)])[0],
+                Template("{{ text|%s }}" % builtin).render(Context({"text": self.text})),
+            )
+
+    def test_filter_runs_once_per_text(self):
+        with mock.patch.object(
+            defaultfilters, "linebreaksbr", wraps=defaultfilters.linebreaksbr
+        ) as linebreaksbr:
+            render_fragments([("linebreaksbr", self.text, None)])
+            render_fragments([("linebreaksbr", self.text, None)])
+            self.assertEqual(linebreaksbr.call_count, 1)
+            # changed text gets rendered afresh
+            self.assertIn("edited", render_fragments([("linebreaksbr", "edited", None)])[0])
+            self.assertEqual(linebreaksbr.call_count, 2)
+
+    def test_detail_page_looks_up_its_fragments_at_once(self):
+        user = User.objects.create_user(username="test", password="secret")
+        post = Post.objects.create(author=user, title="Post", text="Some\ntext")
+        for number in range(3):
+            Comment.objects.create(post=post, author="reader", text=f"Comment\n{number}")
+        self.client.force_login(user)
+        cache = caches[settings.BLOG_FRAGMENT_CACHE_ALIAS]
+        for _ in range(2):
+            with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+                response = self.client.get(reverse("blog:detail", kwargs={"pk": post.pk}))
+            self.assertContains(response, "Some<br>text")
+            self.assertContains(response, "<p>Comment<br>2</p>")
+            # the post's text and its three comments
+            get_many.assert_called_once()
+            self.assertEqual(len(get_many.call_args.args[0]), 4)
+
+
+@skipUnless(connection.vendor == "sqlite", "full-text search uses SQLite FTS5")
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.title_match = Post.objects.create(
+            author=cls.user, title="Knitting patterns", text="all about wool"
+        )
+        cls.title_match.publish(date=timezone.now() - datetime.timedelta(hours=1))
+        cls.text_match = Post.objects.create(
+            author=cls.user, title="Hobbies", text="I like knitting <b>and</b> cooking"
+        )
+        cls.text_match.publish(date=timezone.now() - datetime.timedelta(hours=1))
+        cls.draft = Post.objects.create(author=cls.user, title="Knitting draft", text="draft")
+
+    def test_results_ranked_and_highlighted(self):
+        response = self.client.get(reverse("blog:search"), {"q": "knitting"})
+        self.assertEqual(response.status_code, 200)
+        results = response.context["results"]
+        # title matches rank above body matches, and drafts aren't shown
+        self.assertEqual([result.post for result in results], [self.title_match, self.text_match])
+        self.assertIn("<mark>knitting</mark>", results[1].snippet)
+        self.assertIn("&lt;b&gt;", results[1].snippet)
+
+    def test_prefix_match(self):
+        response = self.client.get(reverse("blog:search"), {"q": "knit"})
+        self.assertEqual(len(response.context["results"]), 2)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.text_match.text = "I like cooking"
+        self.text_match.save()
+        results, next_cursor = search("knitting")
+        self.assertEqual([result.post for result in results], [self.title_match])
+        self.title_match.delete()
+        self.assertEqual(search("knitting"), ([], None))
+
+    def test_approved_comments_are_searchable(self):
+        comment = Comment.objects.create(post=self.text_match, author="me", text="crochet too")
+        self.assertEqual(search("crochet"), ([], None))
+        comment.approve()
+        results, next_cursor = search("crochet")
+        self.assertEqual([result.post for result in results], [self.text_match])
+        comment.delete()
+        self.assertEqual(search("crochet"), ([], None))
+
+    def test_approval_appends_to_the_index(self):
+        first = Comment.objects.create(post=self.text_match, author="me", text="crochet too")
+        first.approve()
+        second = Comment.objects.create(post=self.text_match, author="me", text="and weaving")
+        with CaptureQueriesContext(connection) as queries:
+            second.approve()
+        # the post's other comments aren't loaded again
+        self.assertFalse([query for query in queries if '"blog_comment"."text"' in query["sql"]])
+        for word in ("crochet", "weaving"):
+            results, next_cursor = search(word)
+            self.assertEqual([result.post for result in results], [self.text_match])
+        # unapproving it in the admin takes it out again
+        second.approved_comment = False
+        second.save()
+        self.assertEqual(search("weaving"), ([], None))
+
+    def test_scheduled_posts_are_not_found(self):
+        self.text_match.publish(date=timezone.now() + datetime.timedelta(hours=1))
+        results, next_cursor = search("knitting")
+        self.assertEqual([result.post for result in results], [self.title_match])
+
+    def test_keyset_pagination(self):
+        results, next_cursor = search("knitting", limit=1)
+        self.assertEqual([result.post for result in results], [self.title_match])
+        response = self.client.get(reverse("blog:search"), {"q": "knitting", "after": next_cursor})
+        self.assertEqual([result.post for result in response.context["results"]], [self.text_match])
+        self.assertIsNone(response.context["next_cursor"])
+
+    def test_query_syntax_is_escaped(self):
+        response = self.client.get(reverse("blog:search"), {"q": 'knitting" OR *'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("blog:search"), {"q": "()"})
+        self.assertEqual(list(response.context["results"]), [])
+
+    def test_query_budget(self):
+        """
+        Test that the number of queries stays the same as the number of results grows.
+        """
+        for count in (1, 8):
+            for post in create_busy_posts(self.user, count, 0):
+                post.title = "Knitting again"
+                post.save()
+            # the ranked matches, their snippets and their posts
+            with self.assertQueryBudget(3):
+                response = self.client.get(reverse("blog:search"), {"q": "knitting"})
+            self.assertGreater(len(response.context["results"]), count)
+
+    def test_unavailable_without_sqlite(self):
+        with mock.patch("blog.views.search_available", return_value=False):
+            self.assertEqual(self.client.get(reverse("blog:search"), {"q": "x"}).status_code, 404)
+
+    def test_rebuild_search_index_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_post_search")
+        self.assertEqual(search("knitting"), ([], None))
+        call_command("rebuild_search_index", batch_size=1, stdout=io.StringIO())
+        results, next_cursor = search("knitting")
+        self.assertEqual(len(results), 2)
+
+
+@skipUnless("replica1" in settings.DATABASES, "run with --settings=mysite.test_settings")
+@override_settings(BLOG_READ_REPLICAS=["replica1"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Test routing with the "replica1" database from mysite.test_settings, which mirrors the
+    default test database, by checking which connection each table is read through.
+    """
+
+    databases = "__all__"
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="test", password="secret")
+        self.post = Post.objects.create(author=self.user, title="A post", text="post text")
+        self.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+        # as if the replica had caught up with the post
+        page_cache().clear()
+        user_cache().clear()
+
+    def reads(self):
+        """
+        Captures the queries run on the primary and on the replica, as (primary, replica).
+        """
+        primary = CaptureQueriesContext(connections["default"])
+        replica = CaptureQueriesContext(connections["replica1"])
+        return primary, replica
+
+    def assertReads(self, queries, table, count=True):
+        """
+        Fails unless `queries` read `table`, or if `count` is False, unless they didn't.
+        """
+        selects = [query["sql"] for query in queries if query["sql"].startswith("SELECT")]
+        read = any(f'FROM "{table}"' in sql for sql in selects)
+        self.assertEqual(read, count, f"{table} read: {read}\n" + "\n".join(selects))
+
+    def get(self, url):
+        primary, replica = self.reads()
+        with primary, replica:
+            response = self.client.get(url)
+        return response, primary, replica
+
+    def test_reads_outside_requests_use_primary(self):
+        primary, replica = self.reads()
+        with primary, replica:
+            self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertReads(primary, "blog_post")
+        self.assertEqual(len(replica), 0)
+
+    def test_public_views_read_from_replica(self):
+        response, primary, replica = self.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        self.assertContains(response, "A post")
+        self.assertReads(replica, "blog_post")
+        self.assertReads(primary, "blog_post", False)
+
+    def test_approved_comments_read_from_replica(self):
+        Comment.objects.create(post=self.post, author="me", text="a comment").approve()
+        primary, replica = self.reads()
+        with primary, replica, replica_routing():
+            self.assertEqual(self.post.approved_comments().count(), 1)
+        self.assertReads(replica, "blog_comment")
+        self.assertReads(primary, "blog_comment", False)
+        primary, replica = self.reads()
+        with primary, replica, replica_routing(primary=True):
+            self.assertEqual(self.post.approved_comments().count(), 1)
+        self.assertReads(primary, "blog_comment")
+        self.assertReads(replica, "blog_comment", False)
+
+    def test_reads_after_write_use_primary(self):
+        with replica_routing() as state:
+            Comment.objects.create(post=self.post, author="me", text="a comment")
+            self.assertTrue(state.wrote)
+            primary, replica = self.reads()
+            with primary, replica:
+                self.assertEqual(self.post.comments.count(), 1)
+        self.assertReads(primary, "blog_comment")
+        self.assertEqual(len(replica), 0)
+
+    def test_writes_stick_to_primary(self):
+        response = self.client.post(
+            reverse("blog:add_comment_to_post", kwargs={"pk": self.post.pk}),
+            {"author": "me", "text": "comment text goes here"},
+        )
+        self.assertRedirects(
+            response,
+            reverse("blog:detail", kwargs={"pk": self.post.pk}),
+            fetch_redirect_response=False,
+        )
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        # the browser now reads from the primary
+        response, primary, replica = self.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        self.assertContains(response, "A post")
+        self.assertReads(primary, "blog_post")
+        self.assertEqual(len(replica), 0)
+
+    def test_sessions_and_users_read_from_primary(self):
+        self.client.force_login(self.user)
+        self.client.cookies.pop(PRIMARY_COOKIE, None)
+        response, primary, replica = self.get(reverse("blog:post_list"))
+        self.assertContains(response, "Hello test")
+        self.assertReads(primary, "auth_user")
+        self.assertReads(replica, "django_session", False)
+        self.assertReads(replica, "auth_user", False)
+        self.assertReads(replica, "blog_post")
+
+    def test_cache_refills_use_primary_after_a_change(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        self.post.title = "An edited post"
+        self.post.save()
+        # the replica may not have the edit yet, so the page comes from the primary
+        response, primary, replica = self.get(url)
+        self.assertContains(response, "An edited post")
+        self.assertReads(primary, "blog_post")
+        self.assertReads(replica, "blog_post", False)
+        # once the lag has passed, refills read from the replica again
+        page_cache().clear()
+        response, primary, replica = self.get(url)
+        self.assertContains(response, "An edited post")
+        self.assertReads(replica, "blog_post")
+
+    def test_write_views_use_primary(self):
+        self.client.force_login(self.user)
+        self.client.cookies.pop(PRIMARY_COOKIE, None)
+        primary, replica = self.reads()
+        with primary, replica:
+            response = self.client.get(reverse("blog:post_publish", kwargs={"pk": self.post.pk}))
+        self.assertRedirects(
+            response,
+            reverse("blog:detail", kwargs={"pk": self.post.pk}),
+            fetch_redirect_response=False,
+        )
+        self.assertReads(primary, "blog_post")
+        self.assertEqual(len(replica), 0)
+
+
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=user, title="A post", text="post text goes here")
+        cls.post.publish()
+
+    def setUp(self):
+        super().setUp()
+        queue_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(queue_dir.cleanup)
+        settings_override = override_settings(BLOG_COMMENT_QUEUE_DIR=queue_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def add_comment(self, text):
+        return self.client.post(
+            reverse("blog:add_comment_to_post", kwargs={"pk": self.post.pk}),
+            {"author": "me", "text": text},
+        )
+
+    def test_imports_without_fcntl(self):
+        # as on Windows, where the queue can't be turned on but the views still import it
+        module = importlib.import_module("blog.comment_queue")
+        with mock.patch.dict(sys.modules, {"fcntl": None}):
+            importlib.reload(module)
+        importlib.reload(module)
+
+    def test_comment_queued_and_redirects_to_pending(self):
+        response = self.add_comment("a queued comment")
+        self.assertRedirects(
+            response, reverse("blog:detail", kwargs={"pk": self.post.pk}) + "?comment=pending"
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(response.url), "will appear once it has been approved")
+
+    def test_process_queue_inserts_in_batches(self):
+        for i in range(5):
+            self.add_comment(f"comment {i}")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_queue(batch_size=2), 5)
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith(('INSERT INTO "blog_post" ', 'INSERT INTO "blog_comment" '))
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            list(self.post.comments.order_by("id").values_list("text", flat=True)),
+            [f"comment {i}" for i in range(5)],
+        )
+        self.assertFalse(self.post.comments.filter(approved_comment=True).exists())
+        # the queue is empty afterwards
+        self.assertEqual(process_queue(), 0)
+
+    def test_comments_for_deleted_posts_are_dropped(self):
+        self.add_comment("orphan")
+        self.post.delete()
+        self.assertEqual(process_queue(), 0)
+
+    def test_queueing_makes_no_queries(self):
+        self.add_comment("warm up")
+        with CaptureQueriesContext(connection) as queries:
+            self.add_comment("a queued comment")
+        self.assertFalse([query for query in queries if "blog_" in query["sql"]])
+
+    def test_invalid_lines_are_dead_lettered(self):
+        self.add_comment("before")
+        spool = Path(settings.BLOG_COMMENT_QUEUE_DIR, SPOOL_NAME)
+        bad_lines = [
+            json.dumps({"post": self.post.pk, "author": "me", "text": "t", "created_date": "x"}),
+            json.dumps({"post": self.post.pk, "author": "a" * 201, "text": "t"}),
+            '{"post": 1, "auth',
+        ]
+        with open(spool, "a") as f:
+            f.write("\n".join(bad_lines) + "\n")
+        self.add_comment("after")
+        self.assertEqual(process_queue(), 2)
+        self.assertEqual(
+            list(self.post.comments.order_by("id").values_list("text", flat=True)),
+            ["before", "after"],
+        )
+        with open(Path(settings.BLOG_COMMENT_QUEUE_DIR, DEAD_LETTER_NAME)) as f:
+            self.assertEqual(f.read().splitlines(), bad_lines)
+        # nothing is left to block the queue
+        self.assertEqual(process_queue(), 0)
+
+    def test_process_comment_queue_command(self):
+        self.add_comment("a queued comment")
+        out = io.StringIO()
+        call_command("process_comment_queue", once=True, stdout=out)
+        self.assertIn("Inserted 1 comments", out.getvalue())
+        self.assertTrue(Comment.objects.filter(text="a queued comment").exists())
+
+
+class BulkModerationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=cls.user, title="A post", text="post text goes here")
+        cls.post.publish()
+        cls.other_post = Post.objects.create(author=cls.user, title="Another", text="more text")
+        cls.other_post.publish()
+        cls.comments = [
+            Comment.objects.create(post=post, author=author, text=f"comment by {author}")
+            for post in (cls.post, cls.other_post)
+            for author in ("alice", "spammer", "spammer")
+        ]
+
+    def moderate(self, **data):
+        return self.client.post(reverse("blog:comment_moderate"), data)
+
+    def test_requires_login(self):
+        response = self.moderate(action="approve", post=self.post.pk)
+        self.assertRedirects(
+            response, "/accounts/login/?next=/comment/moderate/", fetch_redirect_response=False
+        )
+        self.assertFalse(Comment.objects.filter(approved_comment=True).exists())
+
+    def test_approve_by_id_in_one_update(self):
+        # cache the post list so the test checks it's invalidated
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 0")
+        self.client.force_login(self.user)
+        ids = [self.comments[0].pk, self.comments[3].pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.moderate(action="approve", comment=ids, next="/")
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "blog_comment"')]
+        self.assertRedirects(response, "/")
+        self.assertEqual(len(updates), 1)
+        self.assertQuerySetEqual(
+            Comment.objects.filter(approved_comment=True).order_by("pk"),
+            [self.comments[0], self.comments[3]],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.approved_comment_count, 1)
+        self.client.logout()
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Comments: 1")
+
+    def test_remove_by_filter_in_one_delete(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_comments(Comment.objects.filter(post=self.post))
+        self.assertEqual([result.post for result in search("spammer")[0]], [self.post])
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.moderate(action="remove", author="spammer")
+        deletes = [q["sql"] for q in queries if q["sql"].startswith('DELETE FROM "blog_comment"')]
+        self.assertEqual(len(deletes), 1)
+        self.assertQuerySetEqual(
+            Comment.objects.order_by("pk"), [self.comments[0], self.comments[3]]
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.approved_comment_count, 1)
+        self.assertEqual([result.post for result in search("spammer")[0]], [])
+
+    def test_query_budget(self):
+        """
+        Test that the number of queries doesn't grow with the number of comments moderated.
+        """
+        self.client.force_login(self.user)
+        for count in (1, 20):
+            comments = Comment.objects.bulk_create(
+                Comment(post=self.post, author="bulk", text="bulk comment") for _ in range(count)
+            )
+            # the user, until it's cached, and a transaction that finds the posts, approves
+            # the comments and recounts the posts' comments
+            with self.assertQueryBudget(6):
+                self.moderate(action="approve", comment=[comment.pk for comment in comments])
+            # a transaction that finds the posts, loads and deletes the comments and recounts
+            # the posts' comments
+            with self.assertQueryBudget(6):
+                self.moderate(action="remove", author="bulk")
+
+    def test_filter_or_selection_required(self):
+        self.client.force_login(self.user)
+        response = self.moderate(action="remove")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Comment.objects.count(), 6)
+
+    def test_unsafe_next_ignored(self):
+        self.client.force_login(self.user)
+        response = self.moderate(action="approve", post=self.post.pk, next="https://example.com/")
+        self.assertRedirects(response, reverse("blog:post_list"))
+
+    def test_admin_actions(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        url = reverse("admin:blog_comment_changelist")
+        self.client.post(
+            url, {"action": "approve_selected", "_selected_action": [self.comments[1].pk]}
+        )
+        self.assertTrue(Comment.objects.get(pk=self.comments[1].pk).approved_comment)
+        self.client.post(
+            url, {"action": "remove_selected", "_selected_action": [self.comments[1].pk]}
+        )
+        self.assertFalse(Comment.objects.filter(pk=self.comments[1].pk).exists())
+
+
+class AsyncURLConf:
+    urlpatterns = [
+        pattern for pattern in mysite.urls.urlpatterns if getattr(pattern, "name", None)
+    ] + [path("", include((async_urlpatterns, "blog")))]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=cls.user, title="A post", text="post text")
+        cls.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+        cls.draft = Post.objects.create(author=cls.user, title="A draft", text="draft text")
+        Comment.objects.create(post=cls.post, author="me", text="approved", approved_comment=True)
+        Comment.objects.create(post=cls.post, author="me", text="unapproved")
+
+    async def test_post_list(self):
+        response = await self.async_client.get(reverse("blog:post_list"))
+        self.assertContains(response, "A post")
+        self.assertNotContains(response, "A draft")
+        self.assertContains(response, "Comments: 1")
+        self.assertTrue(response.has_header("ETag"))
+
+    async def test_post_list_invalid_page(self):
+        response = await self.async_client.get(reverse("blog:post_list") + "?page=9")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_matches_sync_views(self):
+        for url in (reverse("blog:post_list"), reverse("blog:detail", kwargs={"pk": self.post.pk})):
+            async_response = await self.async_client.get(url)
+            with override_settings(ROOT_URLCONF="mysite.urls"):
+                sync_response = await self.async_client.get(url)
+            self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_post_detail(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        response = await self.async_client.get(url)
+        self.assertContains(response, "approved")
+        self.assertNotContains(response, "unapproved")
+        draft_url = reverse("blog:detail", kwargs={"pk": self.draft.pk})
+        self.assertEqual((await self.async_client.get(draft_url)).status_code, 404)
+        await sync_to_async(self.async_client.force_login)(self.user)
+        self.assertContains(await self.async_client.get(url), "unapproved")
+        self.assertEqual((await self.async_client.get(draft_url)).status_code, 200)
+
+    @override_settings(BLOG_COMMENTS_PER_PAGE=1)
+    async def test_paginated_comments_match_sync_views(self):
+        await Comment.objects.acreate(
+            post=self.post, author="me", text="approved later", approved_comment=True
+        )
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        for query in ("", "?comments_page=2", "?comments_page=9"):
+            await page_cache().aclear()
+            async_response = await self.async_client.get(url + query)
+            await page_cache().aclear()
+            with override_settings(ROOT_URLCONF="mysite.urls"):
+                sync_response = await self.async_client.get(url + query)
+            self.assertContains(async_response, "?comments_page=")
+            self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_post_detail_not_modified(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        response = await self.async_client.get(url)
+        await page_cache().aclear()
+        response = await self.async_client.get(url, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous_pages_are_cached(self):
+        url = reverse("blog:detail", kwargs={"pk": self.post.pk})
+        first = await self.async_client.get(url)
+        await Post.objects.filter(pk=self.post.pk).aupdate(title="Changed behind the cache")
+        second = await self.async_client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    async def test_read_views_only_allow_safe_methods(self):
+        for url in (reverse("blog:post_list"), reverse("blog:detail", kwargs={"pk": self.post.pk})):
+            self.assertEqual((await self.async_client.head(url)).status_code, 200)
+            response = await self.async_client.post(url)
+            self.assertEqual(response.status_code, 405)
+            self.assertEqual(response["Allow"], "GET, HEAD")
+
+    async def test_add_comment(self):
+        url = reverse("blog:add_comment_to_post", kwargs={"pk": self.post.pk})
+        self.assertEqual((await self.async_client.get(url)).status_code, 200)
+        response = await self.async_client.post(url, {"author": "you", "text": "new comment"})
+        self.assertRedirects(
+            response,
+            reverse("blog:detail", kwargs={"pk": self.post.pk}),
+            fetch_redirect_response=False,
+        )
+        self.assertTrue(await Comment.objects.filter(text="new comment").aexists())
+
+
+class ASGIBenchmarkTests(TransactionTestCase):
+    """
+    The ASGI handler runs sync code in its own thread, so the seeded rows have to be committed
+    for the requests to see them.
+    """
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf, BLOG_PAGE_CACHE_TIMEOUT=0)
+    async def test_benchmark(self):
+        command = BenchmarkASGICommand()
+        endpoints = await sync_to_async(command.seed)(posts=4, comments=2)
+        for paths in endpoints.values():
+            result = await command.run_benchmark(
+                get_asgi_application(), paths, {"requests": 4, "concurrency": 2}
+            )
+            self.assertEqual(result["errors"], 0)
+            self.assertGreater(result["rps"], 0)
+
+    def test_options_must_be_positive(self):
+        for option in ("--requests=0", "--concurrency=0", "--posts=-1"):
+            with self.assertRaisesMessage(CommandError, "must be at least 1"):
+                call_command("benchmark_asgi", option)
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.published, cls.drafts = seed_database(users=2, posts=4, comments=2, drafts=2)
+
+    def test_seed_database(self):
+        self.assertEqual(Post.published.count(), 4)
+        self.assertEqual(Post.objects.drafts().count(), 2)
+        self.assertEqual(Comment.objects.filter(approved_comment=True).count(), 8)
+
+    def test_synthetic_trace_is_repeatable(self):
+        trace = synthetic_trace(50, self.published, self.drafts, seed=1)
+        self.assertEqual(len(trace), 50)
+        self.assertEqual(trace, synthetic_trace(50, self.published, self.drafts, seed=1))
+        only_lists = synthetic_trace(5, self.published, self.drafts, mix={"list": 1})
+        self.assertTrue(all(entry["path"].startswith("/?page=") for entry in only_lists))
+
+    def test_trace_round_trip(self):
+        trace = synthetic_trace(10, self.published, self.drafts)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl")
+            write_trace(path, trace)
+            self.assertEqual(read_trace(path), trace)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+    def test_replay(self):
+        trace = synthetic_trace(
+            20,
+            self.published,
+            self.drafts,
+            mix={"list": 1, "detail": 1, "comment": 1, "publish": 1},
+        )
+        results = BenchmarkCommand().replay(trace)
+        self.assertEqual(results["total"]["requests"], 20)
+        self.assertEqual(results["total"]["errors"], 0)
+        self.assertLessEqual(
+            set(results["endpoints"]),
+            {"blog:post_list", "blog:detail", "blog:add_comment_to_post", "blog:post_publish"},
+        )
+        self.assertGreater(results["endpoints"]["blog:detail"]["queries_mean"], 0)
+
+
+class StaticSiteExportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="test", password="secret")
+        self.posts = create_busy_posts(self.user, 3, 1)
+        self.output = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+
+    def export(self, **options):
+        out = io.StringIO()
+        call_command("export_site", output=self.output.name, stdout=out, **options)
+        return out.getvalue()
+
+    def read(self, *parts):
+        with open(os.path.join(self.output.name, *parts, "index.html")) as f:
+            return f.read()
+
+    def exists(self, *parts):
+        return os.path.exists(os.path.join(self.output.name, *parts, "index.html"))
+
+    def test_full_export(self):
+        draft = Post.objects.create(author=self.user, title="A draft", text="draft text")
+        self.assertIn("Wrote 5 pages", self.export())
+        newest, middle, oldest = sorted(self.posts, key=lambda post: post.published_date)[::-1]
+        self.assertIn(newest.title, self.read())
+        self.assertIn(middle.title, self.read())
+        self.assertIn(oldest.title, self.read("page", "2"))
+        self.assertIn("Page 2 of 2", self.read("page", "2"))
+        for post in self.posts:
+            self.assertIn(post.title, self.read(str(post.pk)))
+        self.assertIn(reverse("login"), self.read())
+        self.assertFalse(self.exists(str(draft.pk)))
+
+    def test_unchanged_site_is_not_rendered(self):
+        self.export()
+        self.assertIn("Wrote 0 pages", self.export())
+        self.assertIn("Wrote 5 pages", self.export(full=True))
+
+    def test_comment_renders_its_post_and_list_page(self):
+        self.export()
+        # the oldest post, on the second page
+        post = self.posts[0]
+        comment = Comment.objects.create(post=post, author="me", text="a new comment")
+        comment.approve()
+        self.assertIn("Wrote 2 pages", self.export())
+        self.assertIn("a new comment", self.read(str(post.pk)))
+        self.assertIn("Comments: 2", self.read("page", "2"))
+
+    def test_unapproved_comment_is_not_exported(self):
+        self.export()
+        Comment.objects.create(post=self.posts[0], author="me", text="a pending comment")
+        self.export()
+        self.assertNotIn("a pending comment", self.read(str(self.posts[0].pk)))
+
+    def test_publishing_renders_every_list_page(self):
+        self.export()
+        post = Post.objects.create(author=self.user, title="Just published", text="text")
+        post.publish()
+        self.assertIn("Wrote 3 pages", self.export())
+        self.assertIn("Just published", self.read())
+        self.assertIn("Page 1 of 2", self.read())
+        self.assertTrue(self.exists(str(post.pk)))
+
+    def test_unpublished_posts_are_removed(self):
+        self.export()
+        post = self.posts[0]
+        post.delete()
+        self.assertIn("removed 2", self.export())
+        self.assertFalse(self.exists(str(post.pk)))
+        self.assertFalse(self.exists("page", "2"))
+        self.assertNotIn("Page 1 of 2", self.read())
+
+    @override_settings(BLOG_COMMENTS_PER_PAGE=1)
+    def test_comment_pages(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author="me", text="second comment").approve()
+        self.export()
+        self.assertIn("second comment", self.read(str(post.pk), "comments_page", "2"))
+        post.comments.filter(text="second comment").delete()
+        self.export()
+        self.assertFalse(self.exists(str(post.pk), "comments_page", "2"))
+
+    @override_settings(BLOG_CURSOR_PAGINATION=True)
+    def test_cursor_pagination_is_refused(self):
+        with self.assertRaises(CommandError):
+            self.export()
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.posts = create_busy_posts(cls.user, 3, 0)
+        cls.draft = Post.objects.create(author=cls.user, title="A draft", text="draft text")
+
+    def get_feed(self, name, **headers):
+        response = self.client.get(reverse(f"blog:feed_{name}"), **headers)
+        if response.status_code == 200:
+            self.assertTrue(response.streaming)
+            response.text = b"".join(response.streaming_content).decode()
+        return response
+
+    def newest_first(self):
+        return [post.title for post in sorted(self.posts, key=lambda post: post.published_date)][
+            ::-1
+        ]
+
+    def test_atom(self):
+        response = self.get_feed("atom")
+        self.assertEqual(response["Content-Type"], "application/atom+xml; charset=utf-8")
+        namespace = {"atom": "http://www.w3.org/2005/Atom"}
+        root = ElementTree.fromstring(response.text)
+        entries = root.findall("atom:entry", namespace)
+        titles = [entry.find("atom:title", namespace).text for entry in entries]
+        self.assertEqual(titles, self.newest_first())
+        self.assertEqual(
+            entries[0].find("atom:link", namespace).get("href"),
+            f"http://testserver/{self.posts[-1].pk}/",
+        )
+
+    def test_rss(self):
+        response = self.get_feed("rss")
+        self.assertEqual(response["Content-Type"], "application/rss+xml; charset=utf-8")
+        root = ElementTree.fromstring(response.text)
+        titles = [item.find("title").text for item in root.iter("item")]
+        self.assertEqual(titles, self.newest_first())
+
+    def test_json(self):
+        response = self.get_feed("json")
+        self.assertEqual(response["Content-Type"], "application/feed+json; charset=utf-8")
+        feed = json.loads(response.text)
+        self.assertEqual(feed["feed_url"], "http://testserver" + reverse("blog:feed_json"))
+        self.assertEqual([item["title"] for item in feed["items"]], self.newest_first())
+        self.assertEqual(feed["items"][0]["authors"], [{"name": "test"}])
+
+    def test_empty_feeds(self):
+        Post.objects.all().delete()
+        self.assertEqual(json.loads(self.get_feed("json").text)["items"], [])
+        ElementTree.fromstring(self.get_feed("atom").text)
+        ElementTree.fromstring(self.get_feed("rss").text)
+
+    @override_settings(BLOG_FEED_LENGTH=2)
+    def test_feed_length(self):
+        self.assertEqual(len(json.loads(self.get_feed("json").text)["items"]), 2)
+
+    def test_text_is_escaped(self):
+        post = self.posts[0]
+        post.title = "Fish & <chips>"
+        post.text = "line one\nline <two>"
+        post.save()
+        entry = next(
+            entry
+            for entry in ElementTree.fromstring(self.get_feed("atom").text)
+            if entry.tag.endswith("entry") and entry[0].text == "Fish & <chips>"
+        )
+        content = entry.find("{http://www.w3.org/2005/Atom}content").text
+        self.assertEqual(content, "line one<br>line &lt;two&gt;")
+
+    def test_control_characters_are_dropped(self):
+        post = self.posts[0]
+        post.title = "Bell\x07 title"
+        post.text = "form\x0cfeed"
+        post.save()
+        for name in ("atom", "rss"):
+            text = self.get_feed(name).text
+            ElementTree.fromstring(text)
+            self.assertIn("Bell title", text)
+            self.assertIn("formfeed", text)
+
+    def test_author_rename_updates_entries(self):
+        self.get_feed("atom")
+        self.user.username = "renamed"
+        self.user.save()
+        text = self.get_feed("atom").text
+        self.assertIn("<name>renamed</name>", text)
+        self.assertNotIn("<name>test</name>", text)
+
+    def test_conditional_get(self):
+        response = self.get_feed("atom")
+        self.assertFalse(response.has_header("Last-Modified"))
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.get_feed("atom", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304
+            )
+        self.assertEqual(self.get_feed("atom", HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_anonymous_feeds_are_publicly_cacheable(self):
+        self.assertIn("public", self.get_feed("rss")["Cache-Control"])
+
+    def test_only_new_or_edited_entries_are_serialized(self):
+        with mock.patch.object(XMLFeed, "entry", autospec=True, side_effect=XMLFeed.entry) as entry:
+            self.get_feed("atom")
+            self.assertEqual(entry.call_count, 3)
+            self.get_feed("atom")
+            self.assertEqual(entry.call_count, 3)
+            post = self.posts[0]
+            post.title = "An edited title"
+            post.save()
+            self.assertIn("An edited title", self.get_feed("atom").text)
+            self.assertEqual(entry.call_count, 4)
+
+    def test_base_template_links_the_feeds(self):
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertContains(response, reverse("blog:feed_atom"))
+        self.assertContains(response, reverse("blog:feed_json"))
+
+
+class BlogExportImportTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="ola", password="secret")
+        self.posts = create_busy_posts(self.user, 3, 2)
+        self.draft = Post.objects.create(author=self.user, title="A draft", text="draft text")
+        Comment.objects.create(post=self.posts[0], author="reader", text="pending comment")
+        call_command("rebuild_comment_counts", stdout=io.StringIO())
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "blog.ndjson")
+
+    def export(self, **options):
+        call_command("export_blog", output=self.path, stderr=io.StringIO(), **options)
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def import_(self, **options):
+        out = io.StringIO()
+        call_command("import_blog", self.path, stdout=out, **options)
+        return out.getvalue()
+
+    def snapshot(self):
+        return (
+            list(
+                Post.objects.order_by("pk").values_list(
+                    "pk",
+                    "author__username",
+                    "title",
+                    "text",
+                    "excerpt",
+                    "created_date",
+                    "published_date",
+                    "approved_comment_count",
+                )
+            ),
+            list(Comment.objects.order_by("pk").values_list()),
+        )
+
+    def test_export(self):
+        records = self.export()
+        self.assertEqual([record["model"] for record in records], ["post"] * 4 + ["comment"] * 7)
+        self.assertEqual(records[0]["author"], "ola")
+        self.assertIsNone(records[3]["published_date"])
+
+    def test_round_trip(self):
+        self.export(batch_size=2)
+        before = self.snapshot()
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        out = self.import_(batch_size=2)
+        self.assertIn("Imported 4 posts and 7 comments", out)
+        self.assertEqual(self.snapshot(), before)
+        author = User.objects.get(username="ola")
+        self.assertFalse(author.has_usable_password())
+        if search_available():
+            self.assertEqual(len(search("busy")[0]), 3)
+        # the id sequences moved past the imported rows
+        self.assertGreater(Post.objects.create(author=author, title="t", text="t").pk, 4)
+
+    def test_existing_authors_are_reused(self):
+        self.export()
+        Post.objects.all().delete()
+        self.import_()
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Post.objects.filter(author=self.user).count(), 4)
+
+    def test_import_is_batched(self):
+        self.export()
+        Post.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.import_(batch_size=3)
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith(('INSERT INTO "blog_post" ', 'INSERT INTO "blog_comment" '))
+        ]
+        # posts in batches of 3 and 1, comments in batches of 3, 3 and 1
+        self.assertEqual(len(inserts), 5)
+
+    def test_clashing_ids(self):
+        self.export()
+        with self.assertRaisesMessage(CommandError, "clashes"):
+            self.import_()
+
+    def test_malformed_line(self):
+        self.export()
+        Post.objects.all().delete()
+        # cache the empty post list
+        self.assertNotContains(self.client.get(reverse("blog:post_list")), "busy")
+        with open(self.path, "a") as f:
+            f.write('{"model": "comment", "id": 100}\n')
+        with self.assertRaisesMessage(CommandError, "Line 12"):
+            self.import_(batch_size=2)
+        # the batches before it were imported, with their counts and cached pages up to date
+        self.assertEqual((Post.objects.count(), Comment.objects.count()), (4, 6))
+        for post in Post.objects.all():
+            self.assertEqual(post.approved_comment_count, post.approved_comments().count())
+        self.assertContains(self.client.get(reverse("blog:post_list")), "busy")
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="test", password="secret")
+        cls.post = Post.objects.create(author=cls.user, title="A post", text="post text")
+        cls.post.publish(date=timezone.now() - datetime.timedelta(hours=1))
+
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+
+    @override_settings(BLOG_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("blog:post_list"))
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+        self.assertIn("template;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    @override_settings(BLOG_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_metrics_per_view(self):
+        self.client.get(reverse("blog:post_list"))
+        self.client.get(reverse("blog:post_list"))
+        self.client.get(reverse("blog:detail", kwargs={"pk": self.post.pk}))
+        text = metrics_text()
+        self.assertIn("# TYPE blog_request_duration_seconds histogram", text)
+        self.assertIn('blog_request_duration_seconds_count{view="blog:post_list"} 2', text)
+        self.assertIn('blog_db_queries_count{view="blog:detail"} 1', text)
+        self.assertIn('blog_response_size_bytes_bucket{view="blog:post_list",le="+Inf"} 2', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 7):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative_counts()), [(1, 2), (5, 3), (float("inf"), 4)])
+        self.assertEqual((histogram.sum, histogram.count), (11, 4))
+
+    @override_settings(BLOG_METRICS_TOKEN="s3cret")
+    def test_metrics_endpoint_is_protected(self):
+        url = reverse("blog:metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'view="blog:metrics"')
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.static_root.cleanup)
+
+    def collectstatic(self):
+        call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+
+    def get(self, application, path, **environ):
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, **environ}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response["status"] = status
+            response["headers"] = dict(headers)
+
+        response["body"] = b"".join(application(environ, start_response))
+        return response
+
+    def vendor(self, files):
+        # a static directory holding `files`, a dict of path: content, found before blog/static
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, content in files.items():
+            Path(directory.name, name).parent.mkdir(parents=True, exist_ok=True)
+            Path(directory.name, name).write_bytes(content)
+        return directory.name
+
+    def test_vendored_stylesheets_are_served_locally(self):
+        static_dir = self.vendor({path: b"body {}" for path in VENDORED_STYLESHEETS})
+        is_vendored.cache_clear()
+        self.addCleanup(is_vendored.cache_clear)
+        with override_settings(STATICFILES_DIRS=[static_dir]):
+            response = self.client.get(reverse("blog:post_list"))
+        self.assertNotContains(response, "https://")
+        self.assertContains(
+            response, '<link rel="stylesheet" href="/static/vendor/bootstrap/dist/css/bootstrap'
+        )
+
+    def test_stylesheets_not_vendored_are_linked_upstream(self):
+        is_vendored.cache_clear()
+        self.addCleanup(is_vendored.cache_clear)
+        with override_settings(STATICFILES_DIRS=[self.vendor({})]):
+            response = self.client.get(reverse("blog:post_list"))
+        url, integrity = VENDORED_STYLESHEETS["vendor/bootstrap/dist/css/bootstrap.min.css"]
+        self.assertContains(response, f'href="{url}" integrity="{integrity}"')
+        self.assertContains(response, '<i class="bi-lock"></i>')
+
+    def test_vendor_stylesheet(self):
+        url = "https://cdn.example.com/pkg@1.0/css/pkg.css"
+        upstream = {
+            url: b'@font-face { src: url("../fonts/pkg.woff2?v=1") format("woff2"), '
+            b"url(data:font/woff;base64,AAAA) } /*# sourceMappingURL=pkg.css.map */",
+            "https://cdn.example.com/pkg@1.0/fonts/pkg.woff2": b"font",
+            "https://cdn.example.com/pkg@1.0/css/pkg.css.map": b"{}",
+        }
+        with mock.patch("blog.vendor._download", side_effect=upstream.__getitem__):
+            saved = vendor_stylesheet(
+                "vendor/pkg/css/pkg.css", url, integrity(upstream[url]), root=self.static_root.name
+            )
+            self.assertEqual(
+                saved,
+                [
+                    "vendor/pkg/css/pkg.css",
+                    "vendor/pkg/fonts/pkg.woff2",
+                    "vendor/pkg/css/pkg.css.map",
+                ],
+            )
+            self.assertEqual(
+                Path(self.static_root.name, "vendor/pkg/fonts/pkg.woff2").read_bytes(), b"font"
+            )
+            # a changed upstream file isn't saved
+            with self.assertRaises(ValueError):
+                vendor_stylesheet(
+                    "vendor/pkg/css/pkg.css", url, integrity(b"other"), root=self.static_root.name
+                )
+
+    def test_collectstatic_hashes_and_compresses(self):
+        with override_settings(STATIC_ROOT=self.static_root.name):
+            self.collectstatic()
+            with open(os.path.join(self.static_root.name, "staticfiles.json")) as f:
+                hashed_name = json.load(f)["paths"]["css/blog.css"]
+            self.assertRegex(hashed_name, r"^css/blog\.[0-9a-f]{12}\.css$")
+            file_path = os.path.join(self.static_root.name, hashed_name)
+            with open(file_path, "rb") as f, gzip.open(file_path + ".gz") as compressed:
+                self.assertEqual(compressed.read(), f.read())
+            response = self.client.get(reverse("blog:post_list"))
+            self.assertContains(response, f'href="/static/{hashed_name}"')
+
+    def test_static_handler(self):
+        def application(environ, start_response):
+            start_response("404 Not Found", [])
+            return [b"from django"]
+
+        with override_settings(STATIC_ROOT=self.static_root.name):
+            self.collectstatic()
+            handler = StaticFilesMiddleware(application)
+            with open(os.path.join(self.static_root.name, "staticfiles.json")) as f:
+                hashed_name = json.load(f)["paths"]["css/blog.css"]
+
+        response = self.get(handler, f"/static/{hashed_name}")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["headers"]["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response["headers"]["Content-Type"], "text/css; charset=utf-8")
+        self.assertIn(b".btn", response["body"])
+
+        response = self.get(handler, f"/static/{hashed_name}", HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+        self.assertEqual(response["headers"]["Content-Encoding"], "gzip")
+        self.assertIn(b".btn", gzip.decompress(response["body"]))
+
+        response = self.get(handler, "/static/css/blog.css")
+        self.assertNotEqual(response["headers"]["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        response = self.get(
+            handler,
+            "/static/css/blog.css",
+            HTTP_IF_MODIFIED_SINCE=response["headers"]["Last-Modified"],
+        )
+        self.assertEqual(response["status"], "304 Not Modified")
+
+        # collected files that aren't in the manifest are left to Django
+        with open(os.path.join(self.static_root.name, "stale.css"), "w") as f:
+            f.write("body {}")
+        for url in (
+            "/static/missing.css",
+            "/static/stale.css",
+            "/static/../manage.py",
+            "/not-static/",
+        ):
+            self.assertEqual(self.get(handler, url)["body"], b"from django")
+
+    def test_static_handler_without_manifest(self):
+        def application(environ, start_response):
+            start_response("404 Not Found", [])
+            return [b"from django"]
+
+        with open(os.path.join(self.static_root.name, "blog.css"), "w") as f:
+            f.write("body {}")
+        handler = StaticFilesMiddleware(application, root=self.static_root.name)
+        self.assertEqual(self.get(handler, "/static/blog.css")["body"], b"from django")
+
+
+class TemplateLoadingTests(TestCase):
+    def test_template_names(self):
+        names = template_names()
+        self.assertIn("blog/base.html", names)
+        self.assertIn("registration/login.html", names)
+
+    def test_warm_templates_fills_cache(self):
+        loader = engines.all()[0].engine.template_loaders[0]
+        loader.reset()
+        self.assertEqual(warm_templates(), template_names())
+        cached = {template.origin.template_name for template in loader.get_template_cache.values()}
+        self.assertLessEqual(set(template_names()), cached)
+
+    @override_settings(BLOG_WARM_TEMPLATES=True)
+    def test_application_warms_templates(self):
+        for name in ("mysite.wsgi", "mysite.asgi"):
+            module = importlib.import_module(name)
+            with self.subTest(name), mock.patch(
+                "blog.template_cache.warm_templates"
+            ) as warm_templates:
+                importlib.reload(module)
+                warm_templates.assert_called_once_with()
+
+    def test_management_commands_do_not_warm_templates(self):
+        with mock.patch("blog.template_cache.warm_templates") as warm_templates:
+            call_command("check", stdout=io.StringIO())
+        warm_templates.assert_not_called()
+
+    def test_env_flag(self):
+        for value in ("TRUE", "true", "1", "yes", " on "):
+            self.assertIs(env_flag(value), True)
+        for value in ("FALSE", "false", "0", ""):
+            self.assertIs(env_flag(value), False)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command("benchmark_templates", iterations=1, stdout=out)
+        self.assertIn("blog/detail.html", out.getvalue())
+
+
 # Test Forms ---------------------------------------------------------------------------
 
 
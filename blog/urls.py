@@ -1,17 +1,35 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+
+def _urlpatterns(post_list, post_detail, add_comment_to_post):
+    return [
+        path("", post_list, name="post_list"),
+        path("<int:pk>/", post_detail, name="detail"),
+        path("post/new/", views.PostCreateView.as_view(), name="post_new"),
+        path("post/<int:pk>/edit/", views.PostUpdateView.as_view(), name="post_edit"),
+        path("drafts/", views.DraftPostListView.as_view(), name="post_draft_list"),
+        path("post/<int:pk>/publish/", views.post_publish, name="post_publish"),
+        path("post/<int:pk>/remove/", views.PostDeleteView.as_view(), name="post_remove"),
+        path("post/<int:pk>/comment/", add_comment_to_post, name="add_comment_to_post"),
+        path("comment/<int:pk>/approve/", views.comment_approve, name="comment_approve"),
+        path("comment/<int:pk>/remove/", views.comment_remove, name="comment_remove"),
+        path("comment/moderate/", views.comment_moderate, name="comment_moderate"),
+        path("search/", views.search, name="search"),
+        path("feed/atom/", views.feed, {"feed_format": "atom"}, name="feed_atom"),
+        path("feed/rss/", views.feed, {"feed_format": "rss"}, name="feed_rss"),
+        path("feed/json/", views.feed, {"feed_format": "json"}, name="feed_json"),
+        path("metrics/", views.metrics, name="metrics"),
+    ]
+
 
 app_name = "blog"
-urlpatterns = [
-    path("", views.PostListView.as_view(), name="post_list"),
-    path("<int:pk>/", views.PostDetailView.as_view(), name="detail"),
-    path("post/new/", views.PostCreateView.as_view(), name="post_new"),
-    path("post/<int:pk>/edit/", views.PostUpdateView.as_view(), name="post_edit"),
-    path("drafts/", views.DraftPostListView.as_view(), name="post_draft_list"),
-    path("post/<int:pk>/publish/", views.post_publish, name="post_publish"),
-    path("post/<int:pk>/remove/", views.PostDeleteView.as_view(), name="post_remove"),
-    path("post/<int:pk>/comment/", views.add_comment_to_post, name="add_comment_to_post"),
-    path("comment/<int:pk>/approve/", views.comment_approve, name="comment_approve"),
-    path("comment/<int:pk>/remove/", views.comment_remove, name="comment_remove"),
-]
+sync_urlpatterns = _urlpatterns(
+    views.PostListView.as_view(), views.PostDetailView.as_view(), views.add_comment_to_post
+)
+async_urlpatterns = _urlpatterns(
+    async_views.post_list, async_views.post_detail, async_views.add_comment_to_post
+)
+urlpatterns = async_urlpatterns if settings.BLOG_ASYNC_VIEWS else sync_urlpatterns
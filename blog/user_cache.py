@@ -0,0 +1,58 @@
+"""
+Caching the logged-in users, so `CachedAuthenticationMiddleware` doesn't look up
+`request.user` in the database on every request.
+
+Users are kept in the `BLOG_USER_CACHE_ALIAS` cache for `settings.BLOG_USER_CACHE_TIMEOUT`
+seconds. Saving, deleting or logging out a user deletes their entry, so a password change,
+deactivation or change of permissions takes effect on the next request in every process
+sharing the cache. Each request also checks its session's auth hash against the cached user.
+Changes made without saving the user, such as `QuerySet.update()`, are only seen once the
+entry expires.
+"""
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+
+
+def user_cache():
+    return caches[settings.BLOG_USER_CACHE_ALIAS]
+
+
+def _user_key(user_id):
+    return f"blog:user:{user_id}"
+
+
+def get_user(request):
+    """
+    Returns the user logged in to the request's session, from the cache when it can,
+    otherwise as `django.contrib.auth.get_user()` does.
+    """
+    try:
+        user_id = request.session[SESSION_KEY]
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    if not settings.BLOG_USER_CACHE_TIMEOUT:
+        return auth.get_user(request)
+
+    key = _user_key(user_id)
+    # each get unpickles a fresh copy, so requests never share a user object
+    cached = user_cache().get(key)
+    if cached is not None and cached[0] == backend_path:
+        user = cached[1]
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+
+    # not cached, or the session's hash needs the full check
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        user_cache().set(key, (backend_path, user), settings.BLOG_USER_CACHE_TIMEOUT)
+    return user
+
+
+def forget_user(user_id):
+    user_cache().delete(_user_key(user_id))
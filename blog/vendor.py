@@ -0,0 +1,92 @@
+"""
+Third-party stylesheets served from blog/static/vendor/ instead of their CDNs.
+
+Each stylesheet in `VENDORED_STYLESHEETS` is pinned to an upstream URL. `manage.py
+vendor_static` downloads it, together with the fonts and source maps it refers to, into
+blog/static/vendor/ under the same layout as upstream, so its relative URLs keep working and
+`collectstatic` gives every file a hashed name. `{% vendored_stylesheet %}` links to the
+vendored copy, or to the upstream URL for a stylesheet that hasn't been downloaded yet.
+"""
+
+import base64
+import hashlib
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+from urllib.request import urlopen
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+# static path: (upstream URL, subresource integrity hash or None)
+VENDORED_STYLESHEETS = {
+    "vendor/bootstrap/dist/css/bootstrap.min.css": (
+        "https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css",
+        "sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3",
+    ),
+    "vendor/bootstrap-icons/font/bootstrap-icons.min.css": (
+        "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font/bootstrap-icons.min.css",
+        None,
+    ),
+    "vendor/lobster/400.css": (
+        "https://cdn.jsdelivr.net/npm/@fontsource/lobster@5/400.css",
+        None,
+    ),
+}
+
+# the relative URLs a stylesheet loads: url(...) values and its source map
+REFERENCE_PATTERNS = [
+    re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)"""),
+    re.compile(r"sourceMappingURL=(\S+?)\s*\*/"),
+]
+
+
+def integrity(content):
+    digest = hashlib.sha384(content).digest()
+    return "sha384-" + base64.b64encode(digest).decode()
+
+
+def references(css):
+    """
+    Returns the relative URLs in the stylesheet `css`, without their query strings.
+    """
+    found = []
+    for pattern in REFERENCE_PATTERNS:
+        for url in pattern.findall(css):
+            parts = urlsplit(url)
+            if parts.scheme or parts.netloc or not parts.path or url.startswith("#"):
+                continue
+            if parts.path not in found:
+                found.append(parts.path)
+    return found
+
+
+def _download(url):
+    with urlopen(url, timeout=30) as response:
+        return response.read()
+
+
+def vendor_stylesheet(path, url, expected_integrity=None, root=STATIC_DIR):
+    """
+    Downloads the stylesheet at `url` and the files it refers to, saving them under `root`
+    with the stylesheet at `path`, e.g. "vendor/<package>/css/<name>.css". Raises ValueError if
+    the stylesheet doesn't match `expected_integrity` or refers to a file outside
+    "vendor/<package>/". Returns the paths saved.
+    """
+    content = _download(url)
+    if expected_integrity and integrity(content) != expected_integrity:
+        raise ValueError(f"{url} doesn't match its integrity hash {expected_integrity}")
+    files = {path: content}
+    # vendor/<package>/, which everything the stylesheet loads must be inside
+    package = posixpath.join(*path.split("/")[:2], "")
+    for reference in references(content.decode()):
+        reference_path = posixpath.normpath(posixpath.join(posixpath.dirname(path), reference))
+        if not reference_path.startswith(package):
+            raise ValueError(f"{url} refers to {reference}, outside {package}")
+        files[reference_path] = _download(urljoin(url, reference))
+
+    for file_path, file_content in files.items():
+        target = Path(root, file_path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(file_content)
+    return list(files)
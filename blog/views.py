@@ -1,9 +1,19 @@
+import math
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Q
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -12,44 +22,150 @@ from django.views.generic import (
     UpdateView,
 )
 
-from .forms import CommentForm
+from .cache import AnonymousPageCacheMixin, detail_cache_key, list_cache_key
+from .comment_queue import enqueue_comment, queue_enabled
+from .conditional import (
+    post_detail_etag,
+    post_detail_last_modified,
+    post_list_etag,
+    post_list_updated,
+)
+from .feeds import FEED_FORMATS, TITLE, stream_feed
+from .fragments import ExcerptFragmentsMixin, render_fragments
+from .forms import CommentForm, CommentModerationForm, PostForm
+from .instrumentation import metrics_text
 from .models import Comment, Post
+from .moderation import approve_comments, remove_comments
+from .pagination import CursorPaginationMixin, InvalidCursor
+from .routers import use_primary_db
+from .search import search as search_posts
+from .search import search_available
 
 # Create your views here.
 
 
-class PostListView(ListView):
-    queryset = Post.objects.filter(published_date__lte=timezone.now()).order_by("-published_date")
+@method_decorator(condition(etag_func=post_list_etag), name="get")
+class PostListView(AnonymousPageCacheMixin, ExcerptFragmentsMixin, CursorPaginationMixin, ListView):
+    model = Post
     paginate_by = 2
+    excerpt_filter = ("truncatewords", 15)
+    cursor_ordering = ("-published_date", "-id")
 
+    def get_page_cache_key(self):
+        return list_cache_key(self.request)
 
-class DraftPostListView(LoginRequiredMixin, ListView):
-    queryset = Post.objects.filter(published_date__isnull=True).order_by("created_date")
+    def get_page_cache_timeout(self):
+        """
+        Expires the cached page when the next scheduled post goes live.
+        """
+        timeout = super().get_page_cache_timeout()
+        next_publish = Post.objects.next_scheduled_publish()
+        if next_publish is not None:
+            until_publish = math.ceil((next_publish - timezone.now()).total_seconds())
+            timeout = max(1, min(timeout, until_publish))
+        return timeout
+
+    def get_queryset(self):
+        """
+        Adds `num_approved_comments` to each post so the page needs no per-post COUNT query.
+        """
+        if settings.BLOG_USE_COMMENT_COUNT_COLUMN:
+            num_approved_comments = F("approved_comment_count")
+        else:
+            num_approved_comments = Count("comments", filter=Q(comments__approved_comment=True))
+        # evaluated per request, so scheduled posts appear once their publish date has passed
+        # the template only shows the stored excerpt, so leave the full text in the database
+        return (
+            Post.published.defer("text")
+            .order_by("-published_date")
+            .annotate(num_approved_comments=num_approved_comments)
+        )
+
+
+class DraftPostListView(LoginRequiredMixin, ExcerptFragmentsMixin, CursorPaginationMixin, ListView):
+    queryset = Post.objects.drafts().defer("text").order_by("created_date")
     paginate_by = 2
+    excerpt_filter = ("truncatechars", 200)
+    cursor_ordering = ("created_date", "id")
     template_name = "blog/post_draft_list.html"
 
 
-class PostDetailView(DetailView):
+def comments_context(paginator, page_number, first_comments=None):
+    """
+    Returns the `comments` and `comments_page` of a post's detail page. `first_comments` are
+    the first `per_page + 1` comments when no page was asked for: if they all fit, they're
+    shown without pagination, otherwise they're reused as page 1 and only the count is queried.
+    """
+    if first_comments is not None and len(first_comments) <= paginator.per_page:
+        return {"comments": first_comments, "comments_page": None}
+    comments_page = paginator.get_page(page_number)
+    if first_comments is not None:
+        comments_page.object_list = first_comments[: paginator.per_page]
+    return {"comments": comments_page.object_list, "comments_page": comments_page}
+
+
+@method_decorator(
+    condition(etag_func=post_detail_etag, last_modified_func=post_detail_last_modified),
+    name="get",
+)
+class PostDetailView(AnonymousPageCacheMixin, DetailView):
     model = Post
     template_name = "blog/detail.html"
 
-    def get_object(self):
+    def get_page_cache_key(self):
+        return detail_cache_key(self.request, self.kwargs["pk"])
+
+    def get_queryset(self):
         """
-        Hides unpublished posts unless user is logged in.
+        Hides drafts and scheduled posts unless user is logged in.
         """
-        # call default method to get object based on request, then check if post is published or user is logged in
-        obj = super().get_object()
-        if obj.published_date:
-            return obj
-        elif self.request.user.is_authenticated:
-            return obj
-        else:
-            raise Http404("No post found matching the query")
+        if self.request.user.is_authenticated:
+            return Post.objects.all()
+        return Post.published.all()
 
+    def get_comments_queryset(self):
+        """
+        Returns the comments the current user may see: all of them for logged-in users,
+        only approved ones otherwise.
+        """
+        comments = self.object.comments.order_by("created_date", "id")
+        if not self.request.user.is_authenticated:
+            comments = comments.filter(approved_comment=True)
+        return comments
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds `comments`, paginated with `?comments_page=` once there are more than
+        `settings.BLOG_COMMENTS_PER_PAGE` of them, and sets `text_html` on the post and each
+        comment.
+        """
+        context = super().get_context_data(**kwargs)
+        comments = self.get_comments_queryset()
+        paginator = Paginator(comments, settings.BLOG_COMMENTS_PER_PAGE)
+        page_number = self.request.GET.get("comments_page")
+        first_comments = None
+        if page_number is None:
+            # fetch one extra row to find out whether pagination is needed without a COUNT
+            first_comments = list(comments[: paginator.per_page + 1])
+        context.update(comments_context(paginator, page_number, first_comments))
+        comments = list(context["comments"])
+        if context["comments_page"] is not None:
+            context["comments_page"].object_list = comments
+        context["comments"] = comments
+        post_html, *comments_html = render_fragments(
+            [("linebreaksbr", self.object.text, None)]
+            + [("linebreaks", comment.text, None) for comment in comments]
+        )
+        self.object.text_html = post_html
+        for comment, html in zip(comments, comments_html):
+            comment.text_html = html
+        return context
 
+
+@method_decorator(use_primary_db, name="dispatch")
 class PostCreateView(LoginRequiredMixin, CreateView):
     model = Post
-    fields = ["title", "text"]
+    form_class = PostForm
     template_name = "blog/post_edit.html"
 
     def form_valid(self, form):
@@ -58,9 +174,10 @@ class PostCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
+@method_decorator(use_primary_db, name="dispatch")
 class PostUpdateView(LoginRequiredMixin, UpdateView):
     model = Post
-    fields = ["title", "text"]
+    form_class = PostForm
     template_name = "blog/post_edit.html"
 
     def form_valid(self, form):
@@ -69,11 +186,13 @@ class PostUpdateView(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
+@method_decorator(use_primary_db, name="dispatch")
 class PostDeleteView(LoginRequiredMixin, DeleteView):
     model = Post
     success_url = reverse_lazy("blog:post_list")
 
 
+@use_primary_db
 @login_required
 def post_publish(request, pk):
     post = get_object_or_404(Post, pk=pk)
@@ -81,29 +200,114 @@ def post_publish(request, pk):
     return redirect("blog:detail", pk=pk)
 
 
+@use_primary_db
 def add_comment_to_post(request, pk):
-    post = get_object_or_404(Post, pk=pk)
     if request.method == "POST":
         form = CommentForm(request.POST)
         if form.is_valid():
             comment = form.save(commit=False)
-            comment.post = post
+            if queue_enabled():
+                # the queue worker drops comments on missing posts, so don't query for it here
+                comment.post_id = pk
+                enqueue_comment(comment)
+                return redirect(reverse("blog:detail", kwargs={"pk": pk}) + "?comment=pending")
+            comment.post = get_object_or_404(Post, pk=pk)
             comment.save()
-            return redirect("blog:detail", pk=post.id)
+            return redirect("blog:detail", pk=pk)
     else:
         form = CommentForm()
+    get_object_or_404(Post, pk=pk)
     return render(request, "blog/add_comment_to_post.html", {"form": form})
 
 
+@use_primary_db
 @login_required
 def comment_approve(request, pk):
     comment = get_object_or_404(Comment, pk=pk)
     comment.approve()
-    return redirect("blog:detail", pk=comment.post.id)
+    return redirect("blog:detail", pk=comment.post_id)
 
 
+@use_primary_db
 @login_required
 def comment_remove(request, pk):
     comment = get_object_or_404(Comment, pk=pk)
     comment.delete()
-    return redirect("blog:detail", pk=comment.post.id)
+    return redirect("blog:detail", pk=comment.post_id)
+
+
+@use_primary_db
+@login_required
+@require_POST
+def comment_moderate(request):
+    """
+    Approves or removes many comments at once, chosen by id or by filter.
+    """
+    form = CommentModerationForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    if form.cleaned_data["action"] == "approve":
+        approve_comments(form.get_queryset())
+    else:
+        remove_comments(form.get_queryset())
+    next_url = request.POST.get("next")
+    if next_url and url_has_allowed_host_and_scheme(
+        next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        return redirect(next_url)
+    return redirect("blog:post_list")
+
+
+def search(request):
+    if not search_available():
+        raise Http404("Search needs SQLite's full-text search")
+    query = request.GET.get("q", "").strip()
+    try:
+        results, next_cursor = search_posts(
+            query, after=request.GET.get("after"), limit=settings.BLOG_SEARCH_RESULTS_PER_PAGE
+        )
+    except InvalidCursor as e:
+        raise Http404(str(e))
+    return render(
+        request,
+        "blog/search.html",
+        {"query": query, "results": results, "next_cursor": next_cursor},
+    )
+
+
+@condition(etag_func=post_list_etag)
+def feed(request, feed_format):
+    """
+    Streams the latest `settings.BLOG_FEED_LENGTH` published posts in `feed_format`, one of
+    the names in `blog.feeds.FEED_FORMATS`.
+    """
+    feed_format = FEED_FORMATS[feed_format]
+    posts = list(
+        Post.published.select_related("author").order_by("-published_date")[
+            : settings.BLOG_FEED_LENGTH
+        ]
+    )
+    feed_info = {
+        "title": TITLE,
+        "site": request.build_absolute_uri("/"),
+        "link": request.build_absolute_uri(reverse("blog:post_list")),
+        "feed_url": request.build_absolute_uri(),
+        "updated": post_list_updated(request) or timezone.now(),
+    }
+    return StreamingHttpResponse(
+        stream_feed(feed_format, feed_info, posts), content_type=feed_format.content_type
+    )
+
+
+def metrics(request):
+    """
+    Serves the request metrics of this process in the Prometheus text format, to staff users
+    or with the `settings.BLOG_METRICS_TOKEN` bearer token.
+    """
+    token = settings.BLOG_METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not (
+        request.user.is_staff or (token and constant_time_compare(authorization, f"Bearer {token}"))
+    ):
+        raise PermissionDenied
+    return HttpResponse(metrics_text(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,11 @@
+"""
+Reading settings from environment variables.
+"""
+
+
+def env_flag(value):
+    """
+    Returns whether an environment variable's value turns a setting on: "true", "1", "yes" or
+    "on", in any case. Anything else, such as "FALSE", turns it off.
+    """
+    return value.strip().lower() in ("true", "1", "yes", "on")
@@ -13,10 +13,11 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from mysite.env import env_flag
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -24,7 +25,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.environ["DJANGO_DEBUG"]
+DEBUG = env_flag(os.environ["DJANGO_DEBUG"])
 
 ALLOWED_HOSTS = ["127.0.0.1"]
 
@@ -42,11 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "blog.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "blog.middleware.ReplicaRoutingMiddleware",
+    "blog.middleware.AnonymousFastPathMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "blog.middleware.CachedAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -55,9 +59,8 @@ ROOT_URLCONF = "mysite.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "blog.instrumentation.TimedDjangoTemplates",
         "DIRS": [],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
@@ -65,7 +68,18 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
-            "debug": True,
+            # template debug info is recorded on every render, so only collect it when debugging
+            "debug": DEBUG,
+            # each template is read and compiled once per process
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
         },
     },
 ]
@@ -80,10 +94,68 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep connections open between requests, checking they still work before reuse
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Read replicas, as a comma-separated list of SQLite database paths that are kept in sync
+# with the primary database, e.g. DJANGO_READ_REPLICAS=/srv/replica1.sqlite3
+BLOG_READ_REPLICAS = []
+for number, replica_path in enumerate(
+    filter(None, os.environ.get("DJANGO_READ_REPLICAS", "").split(",")), start=1
+):
+    DATABASES[f"replica{number}"] = {
+        **DATABASES["default"],
+        "NAME": replica_path,
+        # under test, a replica is the default test database, as if replication were instant
+        "TEST": {"MIRROR": "default"},
+    }
+    BLOG_READ_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["blog.routers.ReplicaRouter"]
+
+# How long a browser keeps reading from the primary after it writes something.
+BLOG_REPLICA_LAG_SECONDS = 5
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a comment is
+# being written, and busy_timeout makes writers wait for the lock instead of failing.
+BLOG_SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -16 * 1024,  # in KiB when negative
+    "busy_timeout": 5000,
+    "temp_store": "memory",
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# e.g. DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache with
+# DJANGO_CACHE_LOCATION=/var/tmp/django_cache, or
+# DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with
+# DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", ""),
     }
 }
 
 
+# Sessions
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+# Sessions are read from the default cache and only fall back to the database on a miss.
+# They're still written to the database, so they survive a cache restart.
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -119,8 +191,19 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = "static/"
+# filled by `manage.py collectstatic` on deploy; not committed
 STATIC_ROOT = BASE_DIR / "static"
 
+# collectstatic saves files under content-hashed names, with gzip/brotli compressed copies
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "blog.storage.CompressedManifestStaticFilesStorage"},
+}
+
+# Serve STATIC_ROOT from the WSGI application in mysite/wsgi.py, with far-future cache headers
+# for hashed files. Turn off when the web server serves the static files itself.
+BLOG_SERVE_STATIC = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -128,3 +211,83 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
 LOGIN_REDIRECT_URL = "/"
+
+
+# Blog settings
+
+# Read comment counts on the post list from the denormalized Post.approved_comment_count
+# column instead of a COUNT aggregate over comments.
+BLOG_USE_COMMENT_COUNT_COLUMN = False
+
+# Paginate the post and draft lists with opaque ?after= / ?before= cursors instead of page
+# numbers. Cursor pages don't show a total page count.
+BLOG_CURSOR_PAGINATION = False
+
+# Cache the rendered post list and post detail pages for anonymous users, in the
+# BLOG_PAGE_CACHE_ALIAS cache, for BLOG_PAGE_CACHE_TIMEOUT seconds (0 turns it off).
+BLOG_PAGE_CACHE_ALIAS = "default"
+BLOG_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Show comments on a post's detail page in pages of this size.
+BLOG_COMMENTS_PER_PAGE = 50
+
+# Round "now" down to this many seconds when deciding which posts are published, so the
+# published-posts query stays the same within each interval. Scheduled posts may appear up
+# to this many seconds late, never early.
+BLOG_PUBLISH_GRANULARITY = 60
+
+# Cache the HTML rendered from post and comment text, keyed by a hash of the text.
+BLOG_FRAGMENT_CACHE_ALIAS = "default"
+BLOG_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Serve the post list, post detail and comment pages with the async views in
+# blog/async_views.py, for running under ASGI.
+BLOG_ASYNC_VIEWS = env_flag(os.environ.get("DJANGO_ASYNC_VIEWS", ""))
+
+# Record each request's timings, query count and response size in per-view histograms,
+# served in the Prometheus text format at /metrics/ to staff users and to requests with an
+# "Authorization: Bearer <BLOG_METRICS_TOKEN>" header. BLOG_SERVER_TIMING also sends them
+# back to the browser in a Server-Timing header; only in development, as it tells anyone
+# how many queries each page makes and how long they take.
+BLOG_METRICS = True
+BLOG_METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN")
+BLOG_SERVER_TIMING = DEBUG
+
+# Serve anonymous GETs of these public pages (from browsers without a session cookie)
+# without loading a session or the user, and with "Cache-Control: public" for
+# BLOG_ANONYMOUS_CACHE_MAX_AGE seconds instead of "Vary: Cookie". A shared cache in front of
+# the site must skip its cache for requests with the session cookie.
+BLOG_ANONYMOUS_FAST_PATH = True
+BLOG_ANONYMOUS_FAST_PATH_VIEWS = [
+    "blog:post_list",
+    "blog:detail",
+    "blog:search",
+    "blog:feed_atom",
+    "blog:feed_rss",
+    "blog:feed_json",
+]
+BLOG_ANONYMOUS_CACHE_MAX_AGE = 60
+
+# Keep logged-in users in the BLOG_USER_CACHE_ALIAS cache for BLOG_USER_CACHE_TIMEOUT seconds
+# (0 turns it off), instead of looking them up on every request. Saving a user or logging out
+# deletes their entry, so use a cache every process shares (not locmem) with several processes.
+BLOG_USER_CACHE_ALIAS = "default"
+BLOG_USER_CACHE_TIMEOUT = 60
+
+# Directory the export_site command writes the pre-rendered public pages to, for a static
+# file server to serve to anonymous readers.
+BLOG_STATIC_SITE_ROOT = BASE_DIR / "site"
+
+# Number of posts in the Atom, RSS and JSON feeds.
+BLOG_FEED_LENGTH = 20
+
+# Compile every template in blog/templates when the WSGI or ASGI application is loaded, so the
+# first requests don't pay for it. Management commands don't load them.
+BLOG_WARM_TEMPLATES = not DEBUG
+
+# Number of results on each page of search results.
+BLOG_SEARCH_RESULTS_PER_PAGE = 10
+
+# Directory for queueing new comments to be inserted in batches by
+# `manage.py process_comment_queue`. Comments are inserted straight away when unset.
+BLOG_COMMENT_QUEUE_DIR = os.environ.get("DJANGO_COMMENT_QUEUE_DIR")
@@ -0,0 +1,17 @@
+"""
+Settings for running the tests, with a read replica for the routing tests:
+
+    python manage.py test --settings=mysite.test_settings
+
+The replica is configured as DJANGO_READ_REPLICAS would configure it, so under test it mirrors
+the default database. Reads are only routed to it by tests that add it to
+`BLOG_READ_REPLICAS`.
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_READ_REPLICAS", "replica1.sqlite3")
+
+from mysite.settings import *  # noqa: E402, F403
+
+BLOG_READ_REPLICAS = []
@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mysite.settings")
 
 application = get_wsgi_application()
+
+if settings.BLOG_WARM_TEMPLATES:
+    from blog.template_cache import warm_templates
+
+    warm_templates()
+
+if settings.BLOG_SERVE_STATIC:
+    from blog.static_handler import StaticFilesMiddleware
+
+    application = StaticFilesMiddleware(application)